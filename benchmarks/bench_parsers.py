@@ -0,0 +1,144 @@
+"""מדידת עלות הפענוח של כל מקור על עמודים מוקלטים, בלי רשת
+
+    python benchmarks/bench_parsers.py                    # השוואה ל-baseline.json, יוצא עם 1 אם יש סטייה
+    python benchmarks/bench_parsers.py --update-baseline  # שמירת התוצאות הנוכחיות כ-baseline
+    python benchmarks/bench_parsers.py --only ynet walla
+"""
+import argparse
+import gc
+import gzip
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import html_parsing
+from sources import SOURCES_BY_NAME
+from tv_scraper import parse_channel14_dataset
+
+FIXTURES_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+# זמן ריצה חציוני מותר: פי TIME_TOLERANCE מה-baseline ועוד מרווח קבוע לרעש של מדידות קצרות
+TIME_TOLERANCE = 1.5
+TIME_SLACK_MS = 0.5
+MEMORY_TOLERANCE = 1.5
+MEMORY_SLACK_KIB = 64
+
+FIXTURES = {
+    'ynet': 'ynet.html',
+    'walla': 'walla.html',
+    'arutz7': 'arutz7.json',
+    'ynet_tech': 'ynet_tech.html',
+    'calcalist_tech': 'calcalist_tech.html',
+    'keshet12': 'keshet12.html',
+    'reshet13': 'reshet13.json',
+    'channel14': 'channel14_dataset.json',
+    'sport5': 'sport5.html',
+    'sport1': 'sport1.html',
+    'one': 'one.html',
+}
+
+def load_fixture(filename):
+    path = os.path.join(FIXTURES_DIR, filename + '.gz')
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        text = f.read()
+    return json.loads(text) if filename.endswith('.json') else text
+
+def cases(name, fixture):
+    """(שם מקרה, פונקציה) לכל מקור: מסלול הייצור, ועבור HTML גם כל backend על המסמך המלא"""
+    if name == 'channel14':
+        yield f'{name}/rss', lambda: parse_channel14_dataset(fixture)
+        return
+    source = SOURCES_BY_NAME[name]
+    if isinstance(fixture, str):
+        yield f'{name}/pipeline', lambda: source.parse_html(fixture)
+        for backend in (html_parsing.lxml_backend, html_parsing.soup_backend):
+            yield f'{name}/{backend.name}', lambda backend=backend: html_parsing._extract(backend, fixture, source.extract)
+    else:
+        yield f'{name}/json', lambda: source.parse_json(fixture)
+
+def measure(func, repeat):
+    func()  # חימום: קומפילציית סלקטורים ומטמונים
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    gc.collect()
+    tracemalloc.start()
+    blocks_before = len(tracemalloc.take_snapshot().traces)
+    start_size = tracemalloc.get_traced_memory()[0]
+    kept = func()
+    size, peak = tracemalloc.get_traced_memory()
+    blocks_after = len(tracemalloc.take_snapshot().traces)
+    tracemalloc.stop()
+    del kept
+    return result, {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'peak_kib': round((peak - start_size) / 1024, 1),
+        'alloc_blocks': blocks_after - blocks_before,
+        'retained_kib': round((size - start_size) / 1024, 1),
+    }
+
+def check(case, results, stats, baseline):
+    """מחזיר רשימת סטיות מה-baseline: תוצאות פענוח שונות, זמן או זיכרון חורגים"""
+    expected = baseline.get(case)
+    if expected is None:
+        return [f'{case}: אין baseline (הריצו עם --update-baseline)']
+    problems = []
+    if results != expected['results']:
+        problems.append(f'{case}: תוצאות הפענוח השתנו')
+    if stats['median_ms'] > expected['median_ms'] * TIME_TOLERANCE + TIME_SLACK_MS:
+        problems.append(f"{case}: {stats['median_ms']:.2f}ms לעומת {expected['median_ms']:.2f}ms ב-baseline")
+    if stats['peak_kib'] > expected['peak_kib'] * MEMORY_TOLERANCE + MEMORY_SLACK_KIB:
+        problems.append(f"{case}: שיא זיכרון {stats['peak_kib']:.0f}KiB לעומת {expected['peak_kib']:.0f}KiB ב-baseline")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline parser benchmarks")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', nargs='*', help="sources to run")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE) and not args.update_baseline:
+        with open(BASELINE_FILE, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    report, problems = {}, []
+    print(f"{'case':32} {'median ms':>10} {'min ms':>9} {'peak KiB':>9} {'blocks':>8} {'items':>6}")
+    for name, filename in FIXTURES.items():
+        if args.only and name not in args.only:
+            continue
+        fixture = load_fixture(filename)
+        for case, func in cases(name, fixture):
+            results, stats = measure(func, args.repeat)
+            print(f"{case:32} {stats['median_ms']:>10.3f} {stats['min_ms']:>9.3f} {stats['peak_kib']:>9.1f} {stats['alloc_blocks']:>8} {len(results):>6}")
+            report[case] = dict(stats, results=results)
+            if not args.update_baseline:
+                problems.extend(check(case, results, stats, baseline))
+
+    if args.update_baseline:
+        if args.only and os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE, encoding='utf-8') as f:
+                report = dict(json.load(f), **report)
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1, sort_keys=True)
+        print(f"baseline saved to {BASELINE_FILE}")
+        return 0
+    for problem in problems:
+        print(f"DRIFT {problem}")
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,352 @@
+"""בדיקת עומס מקצה לקצה: ה-handlers האמיתיים של הבוט מול אתרים מדומים ו-Bot API מדומה
+
+    python benchmarks/load_test.py --users 50 --duration 30
+    python benchmarks/load_test.py --users 200 --latency 0.3 --failure-rate 0.05 --site-latency channel14=4
+    python benchmarks/load_test.py --ttl 2          # רענונים תכופים: עומס גם על השאיבה והפענוח
+
+האתרים המדומים רצים בתהליך נפרד ומגישים את העמודים מ-benchmarks/fixtures, עם השהיה ושיעור כשלונות
+לפי בחירה. ה-Bot API המדומה רץ בתהליך של הבוט, מקבל את ההודעות שהבוט שולח ומודד מתי כל משתמש קיבל
+את התשובה הסופית (ההודעה עם המקלדת).
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from aiohttp import ClientSession, web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_parsers import FIXTURES, FIXTURES_DIR
+
+STUB_TOKEN = "123456:LOADTEST"
+APIFY_RUN = {'data': {'items': [{'id': 'loadtest-run', 'status': 'SUCCEEDED', 'defaultDatasetId': 'loadtest-dataset'}]}}
+# משקל כל פעולה בתמהיל המשתמשים
+ACTIONS = {
+    '/latest': 40,
+    'tv_news': 20,
+    'sports_news': 15,
+    'tech_news': 10,
+    'top_stories': 10,
+    'latest_news': 5,
+}
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _read_fixture(filename):
+    with gzip.open(os.path.join(FIXTURES_DIR, filename + '.gz'), 'rb') as f:
+        return f.read()
+
+# ---------- אתרים מדומים (תהליך נפרד) ----------
+
+def _site_app(latency, site_latency, jitter, failure_rate):
+    bodies = {name: _read_fixture(filename) for name, filename in FIXTURES.items()}
+    etags = {name: '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"' for name, body in bodies.items()}
+    served = Counter()
+
+    async def delay_or_fail(name):
+        served[name] += 1
+        mean = site_latency.get(name, latency)
+        if mean:
+            await asyncio.sleep(mean * random.uniform(1 - jitter, 1 + jitter))
+        if random.random() < failure_rate:
+            served[name + ':failed'] += 1
+            raise web.HTTPServiceUnavailable()
+
+    async def site(request):
+        name = request.match_info['name']
+        await delay_or_fail(name)
+        if request.headers.get('If-None-Match') == etags[name]:
+            return web.Response(status=304)
+        content_type = 'application/json' if FIXTURES[name].endswith('.json') else 'text/html'
+        return web.Response(body=bodies[name], content_type=content_type, charset='utf-8', headers={'ETag': etags[name]})
+
+    async def apify_runs(request):
+        await delay_or_fail('channel14')
+        return web.json_response(APIFY_RUN)
+
+    async def apify_items(request):
+        return web.Response(body=bodies['channel14'], content_type='application/json')
+
+    async def stats(request):
+        return web.json_response(served)
+
+    app = web.Application()
+    app.router.add_get('/site/{name}', site)
+    app.router.add_get('/apify/acts/{actor}/runs', apify_runs)
+    app.router.add_get('/apify/datasets/{dataset}/items', apify_items)
+    app.router.add_get('/_stats', stats)
+    return app
+
+def _serve_sites(port, latency, site_latency, jitter, failure_rate):
+    web.run_app(_site_app(latency, site_latency, jitter, failure_rate), host='127.0.0.1', port=port, print=None, access_log=None)
+
+# ---------- Bot API מדומה ----------
+
+class TelegramStub:
+    """מחזיר תשובות תקינות ל-Bot API, ומעיר את המשתמש המדומה כשמגיעה אליו תשובה"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self._first = {}
+        self._final = {}
+        self._message_id = 0
+
+    def expect(self, chat_id):
+        loop = asyncio.get_running_loop()
+        self._first[chat_id] = loop.create_future()
+        self._final[chat_id] = loop.create_future()
+        return self._first[chat_id], self._final[chat_id]
+
+    def _message(self, params):
+        self._message_id += 1
+        chat_id = int(params['chat_id'])
+        now = time.perf_counter()
+        first = self._first.pop(chat_id, None)
+        if first is not None and not first.done():
+            first.set_result(now)
+        # ההודעה הסופית של כל פעולה היא זו שמגיעה עם מקלדת
+        if 'reply_markup' in params:
+            final = self._final.pop(chat_id, None)
+            if final is not None and not final.done():
+                final.set_result(now)
+        return {'message_id': self._message_id, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', '')}
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'loadtest', 'username': 'loadtest_bot',
+                      'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False}
+        elif method in ('sendMessage', 'sendDocument'):
+            result = self._message(params)
+        elif method == 'getChat':
+            result = {'id': int(params['chat_id']), 'type': 'private', 'username': None}
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        return app
+
+# ---------- משתמשים מדומים ----------
+
+def _update(update_id, user_id, action):
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}', 'username': f'user{user_id}'}
+    chat = {'id': user_id, 'type': 'private'}
+    now = int(time.time())
+    if action.startswith('/'):
+        return {'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': now, 'chat': chat, 'from': user, 'text': action,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(action)}]
+        }}
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': action,
+        'message': {'message_id': 1, 'date': now, 'chat': chat, 'text': 'menu'}
+    }}
+
+class LoadResults:
+    def __init__(self):
+        self.first = []
+        self.final = []
+        self.by_action = {}
+        self.timeouts = Counter()
+        self.completed = 0
+
+async def simulated_user(user_id, webhook_url, stub, session, results, deadline, args, update_ids):
+    actions, weights = list(ACTIONS), list(ACTIONS.values())
+    rng = random.Random(user_id)
+    await asyncio.sleep(rng.uniform(0, args.ramp_up))
+    while time.perf_counter() < deadline:
+        action = rng.choices(actions, weights)[0]
+        first, final = stub.expect(user_id)
+        started = time.perf_counter()
+        async with session.post(webhook_url, json=_update(next(update_ids), user_id, action)) as response:
+            response.raise_for_status()
+        try:
+            finished = await asyncio.wait_for(asyncio.shield(final), args.timeout)
+        except asyncio.TimeoutError:
+            results.timeouts[action] += 1
+            continue
+        results.completed += 1
+        if first.done():
+            results.first.append(first.result() - started)
+        results.final.append(finished - started)
+        results.by_action.setdefault(action, []).append(finished - started)
+        if args.think:
+            await asyncio.sleep(rng.expovariate(1 / args.think))
+
+async def sample_loop_lag(interval, lags, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def _ms(values, pct):
+    return f"{percentile(values, pct) * 1000:8.1f}"
+
+# ---------- הרצה ----------
+
+def _configure_environment(tmp_dir, stub_port, throttle):
+    os.environ['TELEGRAM_TOKEN'] = STUB_TOKEN
+    os.environ.setdefault('APIFY_API_TOKEN', 'loadtest')
+    os.environ['TELEGRAM_API_BASE_URL'] = f'http://127.0.0.1:{stub_port}'
+    os.environ['USAGE_DB_FILE'] = os.path.join(tmp_dir, 'bot_usage.db')
+    os.environ['SUBSCRIPTIONS_DB_FILE'] = os.path.join(tmp_dir, 'subscriptions.db')
+    os.environ['HEADLINES_DB_FILE'] = os.path.join(tmp_dir, 'headlines.db')
+    os.environ['USER_THROTTLE_SECONDS'] = str(throttle)
+
+async def _wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"stand-in server on port {port} did not start")
+
+async def run(args, sites_port, stub_port, webhook_port):
+    import newsflashil
+    import tv_scraper
+    import webhook_server
+    from pipeline import register_sources
+    from sources import SOURCES
+
+    logging.getLogger().setLevel(getattr(logging, args.log_level))
+    for source in SOURCES:
+        if source.fetch != 'custom':
+            source.url = f'http://127.0.0.1:{sites_port}/site/{source.name}'
+        if args.ttl:
+            source.ttl = args.ttl
+    tv_scraper.APIFY_API_URL = f'http://127.0.0.1:{sites_port}/apify'
+    register_sources(newsflashil.headline_cache, SOURCES)
+    newsflashil.register_handlers(newsflashil.bot_app)
+
+    stub = TelegramStub()
+    runners = []
+    for app, port in ((stub.app(), stub_port), (webhook_server.create_web_app(newsflashil.bot_app, secret=None), webhook_port)):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        runners.append(runner)
+
+    bot_app = newsflashil.bot_app
+    async with bot_app:
+        await bot_app.post_init(bot_app)
+        await bot_app.start()
+        # חימום: מילוי המטמון כדי שהמדידה תתחיל ממצב יציב
+        await newsflashil.fetch_sources(*[source.name for source in SOURCES])
+
+        results, lags, stop = LoadResults(), [], asyncio.Event()
+        lag_task = asyncio.ensure_future(sample_loop_lag(args.lag_interval, lags, stop))
+        update_ids = iter(range(1, 10 ** 9))
+        webhook_url = f'http://127.0.0.1:{webhook_port}{webhook_server.WEBHOOK_PATH}'
+        started = time.perf_counter()
+        deadline = started + args.duration
+        async with ClientSession() as session:
+            await asyncio.gather(*(simulated_user(100000 + i, webhook_url, stub, session, results, deadline, args, update_ids)
+                                   for i in range(args.users)))
+            elapsed = time.perf_counter() - started
+            async with session.get(f'http://127.0.0.1:{sites_port}/_stats') as response:
+                served = await response.json()
+        stop.set()
+        await lag_task
+
+        await bot_app.stop()
+        await bot_app.post_shutdown(bot_app)
+    for runner in runners:
+        await runner.cleanup()
+    return results, lags, elapsed, served, stub.calls
+
+def report(args, results, lags, elapsed, served, calls):
+    total_timeouts = sum(results.timeouts.values())
+    print(f"\nusers={args.users} duration={elapsed:.1f}s site latency={args.latency}s failure rate={args.failure_rate:.0%} ttl={args.ttl or 'default'}")
+    print(f"completed {results.completed} actions, {total_timeouts} timed out (>{args.timeout}s), throughput {results.completed / elapsed:.1f} actions/s")
+    print(f"\n{'latency (ms)':24} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'count':>7}")
+    print(f"{'first reply':24} {_ms(results.first, 50)} {_ms(results.first, 95)} {_ms(results.first, 99)} {_ms(results.first, 100)} {len(results.first):>7}")
+    print(f"{'final reply':24} {_ms(results.final, 50)} {_ms(results.final, 95)} {_ms(results.final, 99)} {_ms(results.final, 100)} {len(results.final):>7}")
+    for action, values in sorted(results.by_action.items()):
+        print(f"{'  ' + action:24} {_ms(values, 50)} {_ms(values, 95)} {_ms(values, 99)} {_ms(values, 100)} {len(values):>7}")
+    blocked = [lag for lag in lags if lag >= args.block_threshold]
+    print(f"\nevent loop: {len(lags)} samples every {args.lag_interval * 1000:.0f}ms, lag p99 {percentile(lags, 99) * 1000:.1f}ms, "
+          f"max {percentile(lags, 100) * 1000:.1f}ms, blocked >{args.block_threshold * 1000:.0f}ms {len(blocked)} times "
+          f"({sum(blocked):.2f}s total)")
+    print(f"stand-in requests: {dict(sorted(served.items()))}")
+    print(f"bot API calls: {dict(sorted(calls.items()))}")
+    if total_timeouts:
+        print(f"timeouts by action: {dict(results.timeouts)}")
+
+def parse_site_latency(values):
+    overrides = {}
+    for value in values or ():
+        name, _, seconds = value.partition('=')
+        overrides[name] = float(seconds)
+    return overrides
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end load test against stand-in news sites and Bot API")
+    parser.add_argument('--users', type=int, default=20, help="concurrent simulated users")
+    parser.add_argument('--duration', type=float, default=20, help="seconds of load after warm-up")
+    parser.add_argument('--ramp-up', type=float, default=2, help="users start spread over this many seconds")
+    parser.add_argument('--think', type=float, default=0.5, help="mean pause between a user's actions (seconds)")
+    parser.add_argument('--timeout', type=float, default=30, help="an action without a final reply after this long counts as timed out")
+    parser.add_argument('--latency', type=float, default=0.1, help="mean response latency of the stand-in sites (seconds)")
+    parser.add_argument('--jitter', type=float, default=0.5, help="latency varies uniformly by ±this fraction")
+    parser.add_argument('--site-latency', nargs='*', metavar='SOURCE=SECONDS', help="per-source latency overrides")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="share of stand-in responses that fail with 503")
+    parser.add_argument('--ttl', type=float, default=0, help="override every source's cache TTL (0 keeps the registry values)")
+    parser.add_argument('--throttle', type=float, default=0, help="per-user throttle interval; off by default since simulated users wait less than a real one")
+    parser.add_argument('--lag-interval', type=float, default=0.01)
+    parser.add_argument('--block-threshold', type=float, default=0.05, help="loop lag above this counts as blocking")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args(argv)
+
+    sites_port, stub_port, webhook_port = _free_port(), _free_port(), _free_port()
+    sites = multiprocessing.Process(
+        target=_serve_sites,
+        args=(sites_port, args.latency, parse_site_latency(args.site_latency), args.jitter, args.failure_rate),
+        daemon=True
+    )
+    sites.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            _configure_environment(tmp_dir, stub_port, args.throttle)
+
+            async def start():
+                await _wait_for_port(sites_port)
+                return await run(args, sites_port, stub_port, webhook_port)
+
+            report(args, *asyncio.run(start()))
+    finally:
+        sites.terminate()
+        sites.join()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""הקלטה מחדש של העמודים שמשמשים את bench_parsers.py מהאתרים עצמם
+
+    python benchmarks/record_fixtures.py                 # כל המקורות (ערוץ 14 רק אם APIFY_API_TOKEN מוגדר)
+    python benchmarks/record_fixtures.py ynet sport5
+
+אחרי הקלטה יש להריץ bench_parsers.py --update-baseline, כי תוצאות הפענוח משתנות.
+"""
+import asyncio
+import gzip
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import http_client
+import tv_scraper
+from bench_parsers import FIXTURES, FIXTURES_DIR
+from sources import SOURCES_BY_NAME
+from sports_scraper import session_pool
+
+def save(filename, text):
+    with gzip.open(os.path.join(FIXTURES_DIR, filename + '.gz'), 'wt', encoding='utf-8', compresslevel=9) as f:
+        f.write(text)
+    print(f"recorded {filename} ({len(text) // 1024} KiB)")
+
+async def record(name):
+    source = SOURCES_BY_NAME[name]
+    if name == 'channel14':
+        if not tv_scraper.APIFY_API_TOKEN:
+            print("skipping channel14: APIFY_API_TOKEN is not set")
+            return
+        runs = await tv_scraper._apify_get(f"/acts/{tv_scraper.APIFY_ACTOR_ID}/runs?limit=1&desc=1&status=SUCCEEDED")
+        dataset_id = runs['data']['items'][0]['defaultDatasetId']
+        text = json.dumps(await tv_scraper._apify_get(f"/datasets/{dataset_id}/items"), ensure_ascii=False)
+    elif source.fetch == 'cloudscraper':
+        response = await asyncio.to_thread(session_pool.get, source.url, headers=http_client.BASE_HEADERS, timeout=15)
+        response.raise_for_status()
+        text = response.text
+    else:
+        text = await http_client.fetch_text(source.url, headers=http_client.BASE_HEADERS, timeout=30)
+    save(FIXTURES[name], text)
+
+async def main(names):
+    try:
+        for name in names or FIXTURES:
+            try:
+                await record(name)
+            except Exception as e:
+                print(f"failed to record {name}: {e}")
+    finally:
+        await http_client.close()
+
+if __name__ == '__main__':
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,85 @@
+import logging
+import os
+import time
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# כמה כשלונות רצופים פותחים את המעגל
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+# כמה זמן המעגל פתוח לפני בדיקת התאוששות; מוכפל אחרי כל בדיקה שנכשלה, עד המקסימום
+OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+MAX_OPEN_SECONDS = float(os.getenv("CIRCUIT_MAX_OPEN_SECONDS", "600"))
+# זמן קצוב אדפטיבי: אחוזון 95 של זמני ההצלחה האחרונים כפול מקדם, בין המינימום למקסימום
+TIMEOUT_PERCENTILE = 0.95
+TIMEOUT_FACTOR = float(os.getenv("CIRCUIT_TIMEOUT_FACTOR", "2"))
+MIN_TIMEOUT = float(os.getenv("CIRCUIT_MIN_TIMEOUT", "3"))
+MAX_TIMEOUT = float(os.getenv("CIRCUIT_MAX_TIMEOUT", "30"))
+LATENCY_SAMPLES = 50
+# עד שנצברו מספיק מדידות משתמשים בזמן הקצוב המקסימלי
+MIN_SAMPLES = 5
+
+UNAVAILABLE_MESSAGE = "המקור אינו זמין זמנית, מנסים שוב ברקע"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """מעקב אחר בריאות מקור: זמן קצוב לפי זמני התגובה האחרונים, ומעגל שנפתח אחרי כשלונות רצופים"""
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS, max_timeout=MAX_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_timeout = max_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.cooldown = open_seconds
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        metrics.circuit_open.set(0, name)
+
+    def timeout(self):
+        if len(self._latencies) < MIN_SAMPLES:
+            return self.max_timeout
+        ordered = sorted(self._latencies)
+        percentile = ordered[min(len(ordered) - 1, int(len(ordered) * TIMEOUT_PERCENTILE))]
+        return min(self.max_timeout, max(MIN_TIMEOUT, percentile * TIMEOUT_FACTOR))
+
+    def allow_request(self):
+        """האם מותר לפנות למקור עכשיו; מעגל פתוח שעבר את זמן ההמתנה עובר למצב בדיקה"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            logger.info(f"Circuit of {self.name} half-open, probing")
+            return True
+        # במצב בדיקה רק רענון אחד רץ בכל פעם, והמטמון כבר מאחד רענונים מקבילים
+        return self.state == HALF_OPEN
+
+    def record_success(self, duration):
+        self._latencies.append(duration)
+        metrics.fetch_timeout_seconds.set(self.timeout(), self.name)
+        if self.state != CLOSED:
+            logger.info(f"Circuit of {self.name} closed after successful probe")
+            metrics.circuit_open.set(0, self.name)
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = self.open_seconds
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, MAX_OPEN_SECONDS)
+            self._open()
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        metrics.circuit_open.set(1, self.name)
+        logger.warning(f"Circuit of {self.name} opened after {self.failures} failures, retrying in {self.cooldown:.0f}s")
@@ -1,35 +1,379 @@
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import atexit
+import csv
+import gzip
+import json
+import time
+from collections import Counter, OrderedDict
+import logging
+import queue
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
 
 LOG_FILE = "bot_usage_log.csv"
-log_data = []
+DB_FILE = os.getenv("USAGE_DB_FILE", "bot_usage.db")
+# כל כמה שניות נכתבת אצווה לדיסק, וכמה רשומות לכל היותר באצווה
+FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "2"))
+BATCH_SIZE = 500
+# גודל מקסימלי של החוצץ בזיכרון; מעבר לו רשומות נזרקות במקום לחסום את הבוט
+MAX_BUFFER = int(os.getenv("USAGE_MAX_BUFFER", "10000"))
+# מספר השורות המקסימלי בקובץ ייצוא אחד
+EXPORT_MAX_ROWS = int(os.getenv("USAGE_EXPORT_MAX_ROWS", "200000"))
+COLUMNS = ["user_id", "command", "username", "timestamp"]
+# כל כמה שניות נשמרת תמונת מצב של הסטטיסטיקות, כדי שלא יחושבו מחדש מכל ההיסטוריה באתחול
+STATS_SNAPSHOT_INTERVAL = int(os.getenv("USAGE_STATS_SNAPSHOT_INTERVAL", "60"))
+LATEST_COMMANDS = ("/latest", "latest_news")
+SECTION_COMMANDS = ("sports_news", "tech_news", "tv_news", "top_stories")
+
+_buffer = queue.Queue(maxsize=MAX_BUFFER)
+_write_lock = threading.Lock()
+_conn = None
+_flusher = None
+dropped = 0
+
+class UsageStats:
+    """סטטיסטיקות שימוש מצטברות שמתעדכנות בכל אינטראקציה, כך ש-/stats לא סורק את ההיסטוריה"""
+
+    DAYS_KEPT = 30
+    HOURS_KEPT = 48
+    TOP_USERS = 10
+    CLICK_WINDOW = 1800
+    MAX_TRACKED_USERS = 100000
+    # מה שנשמר בתמונת המצב: הימים ש-/stats מציג, והמשתמשים עם הכי הרבה אינטראקציות (לדירוג המובילים)
+    DAYS_SHOWN = 7
+    SNAPSHOT_USERS = 1000
+    _STATE = ('command_counts', 'daily_users', 'hourly_users', 'user_counts', 'top_users', 'usernames', 'last_latest', 'section_clicks')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.command_counts = Counter()
+        self.daily_users = OrderedDict()
+        self.hourly_users = OrderedDict()
+        self.user_counts = Counter()
+        self.top_users = []
+        self.usernames = OrderedDict()
+        self.last_latest = OrderedDict()
+        self.section_clicks = Counter()
+
+    @staticmethod
+    def _bounded_set(buckets, key, keep):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = set()
+            while len(buckets) > keep:
+                buckets.popitem(last=False)
+        return bucket
+
+    @staticmethod
+    def _touch(mapping, key, value, cap):
+        mapping[key] = value
+        mapping.move_to_end(key)
+        if len(mapping) > cap:
+            mapping.popitem(last=False)
+
+    def _update_top(self, user_id):
+        count = self.user_counts[user_id]
+        if user_id not in self.top_users:
+            if len(self.top_users) >= self.TOP_USERS and count <= self.user_counts[self.top_users[-1]]:
+                return
+            self.top_users.append(user_id)
+        self.top_users.sort(key=lambda u: -self.user_counts[u])
+        del self.top_users[self.TOP_USERS:]
+
+    def record(self, user_id, command, username, timestamp, epoch=None):
+        """epoch הוא אותו רגע כמו timestamp; בלעדיו (שחזור מהלוג) הוא מחושב מהמחרוזת"""
+        if epoch is None:
+            epoch = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+        with self.lock:
+            self.command_counts[command] += 1
+            self._bounded_set(self.daily_users, timestamp[:10], self.DAYS_KEPT).add(user_id)
+            self._bounded_set(self.hourly_users, timestamp[:13], self.HOURS_KEPT).add(user_id)
+            self.user_counts[user_id] += 1
+            self._update_top(user_id)
+            if username and username != "N/A":
+                self._touch(self.usernames, user_id, username, self.MAX_TRACKED_USERS)
+            if command in LATEST_COMMANDS:
+                # זמן הצפייה האחרונה במבזקים, והמדורים שכבר נלחצו מאז (כל מדור נספר פעם אחת לכל צפייה)
+                self._touch(self.last_latest, user_id, [epoch, []], self.MAX_TRACKED_USERS)
+            elif command in SECTION_COMMANDS:
+                seen = self.last_latest.get(user_id)
+                if seen is not None and epoch - seen[0] <= self.CLICK_WINDOW and command not in seen[1]:
+                    seen[1].append(command)
+                    self.section_clicks[command] += 1
+
+    def _merge(self, other):
+        """מיזוג סטטיסטיקות של אירועים מאוחרים יותר (other) לתוך אלה; המנעולים באחריות הקורא"""
+        self.command_counts.update(other.command_counts)
+        for buckets, others, keep in ((self.daily_users, other.daily_users, self.DAYS_KEPT), (self.hourly_users, other.hourly_users, self.HOURS_KEPT)):
+            for key, users in others.items():
+                self._bounded_set(buckets, key, keep).update(users)
+        self.user_counts.update(other.user_counts)
+        self.top_users = [u for u, _ in self.user_counts.most_common(self.TOP_USERS)]
+        for user_id, name in other.usernames.items():
+            self._touch(self.usernames, user_id, name, self.MAX_TRACKED_USERS)
+        for user_id, seen in other.last_latest.items():
+            self._touch(self.last_latest, user_id, seen, self.MAX_TRACKED_USERS)
+        self.section_clicks.update(other.section_clicks)
+
+    def absorb_history(self, earlier):
+        """מיזוג סטטיסטיקות של אירועים מוקדמים יותר (earlier, אובייקט פרטי) לתוך האובייקט החי.
+        הכול קורה תחת המנעול שלו, כך ש-record שרץ בינתיים לא הולך לאיבוד"""
+        with self.lock:
+            earlier._merge(self)
+            for name in self._STATE:
+                setattr(self, name, getattr(earlier, name))
+
+    def snapshot(self):
+        """העתק חסום של מה ש-/stats מציג: ימים ושעות אחרונים, המשתמשים הפעילים ביותר וצפיות שעוד בחלון ההקלקה.
+        תחת המנעול רק מעתיקים, כדי שהסדרה לא תעכב את record בלולאת הבוט"""
+        cutoff = time.time() - self.CLICK_WINDOW
+        with self.lock:
+            days = sorted(self.daily_users)[-self.DAYS_SHOWN:]
+            hours = sorted(self.hourly_users)[-2:]
+            daily = {k: list(self.daily_users[k]) for k in days}
+            hourly = {k: list(self.hourly_users[k]) for k in hours}
+            command_counts = dict(self.command_counts)
+            user_counts = self.user_counts.copy()
+            section_clicks = dict(self.section_clicks)
+            # last_latest מסודר לפי זמן הצפייה, ולכן עוצרים בצפייה הראשונה שמחוץ לחלון
+            last_latest = []
+            for user_id, seen in reversed(self.last_latest.items()):
+                if seen[0] < cutoff:
+                    break
+                last_latest.append((user_id, seen[0], list(seen[1])))
+        top_counts = user_counts.most_common(self.SNAPSHOT_USERS)
+        with self.lock:
+            usernames = {str(u): self.usernames[u] for u, _ in top_counts if u in self.usernames}
+        return {
+            'command_counts': command_counts,
+            'daily_users': daily,
+            'hourly_users': hourly,
+            'user_counts': {str(u): c for u, c in top_counts},
+            'usernames': usernames,
+            'last_latest': {str(u): [epoch, clicked] for u, epoch, clicked in reversed(last_latest)},
+            'section_clicks': section_clicks
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        stats = cls()
+        stats.command_counts = Counter(data['command_counts'])
+        stats.daily_users = OrderedDict((k, set(v)) for k, v in data['daily_users'].items())
+        stats.hourly_users = OrderedDict((k, set(v)) for k, v in data['hourly_users'].items())
+        stats.user_counts = Counter({int(k): v for k, v in data['user_counts'].items()})
+        stats.top_users = [u for u, _ in stats.user_counts.most_common(cls.TOP_USERS)]
+        stats.usernames = OrderedDict((int(k), v) for k, v in data['usernames'].items())
+        stats.last_latest = OrderedDict((int(k), v) for k, v in data['last_latest'].items())
+        stats.section_clicks = Counter(data['section_clicks'])
+        return stats
+
+    def summary(self):
+        """תמונת מצב לתצוגה; הזמן תלוי רק בגודל החלונות הקבועים ולא באורך ההיסטוריה"""
+        now = datetime.now()
+        with self.lock:
+            latest_views = sum(self.command_counts[c] for c in LATEST_COMMANDS)
+            return {
+                'commands': dict(self.command_counts.most_common()),
+                'dau': len(self.daily_users.get(now.strftime("%Y-%m-%d"), ())),
+                'hau': len(self.hourly_users.get(now.strftime("%Y-%m-%d %H"), ())),
+                'daily': {k: len(v) for k, v in list(self.daily_users.items())[-self.DAYS_SHOWN:]},
+                'top_users': [(u, self.usernames.get(u, "N/A"), self.user_counts[u]) for u in self.top_users],
+                'click_through': {c: (self.section_clicks[c], self.section_clicks[c] / latest_views if latest_views else 0.0) for c in SECTION_COMMANDS}
+            }
 
-# טען נתונים קיימים מהקובץ בהתחלה (אם קיים)
-if os.path.exists(LOG_FILE):
-    df = pd.read_csv(LOG_FILE)
-    log_data = df.to_dict('records')  # המרת ה-DataFrame לרשימה של מילונים
+stats = UsageStats()
+
+def _connect():
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS interactions ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "user_id INTEGER, command TEXT, username TEXT, timestamp TEXT)"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS stats_snapshot (id INTEGER PRIMARY KEY CHECK (id = 1), data TEXT)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_interactions_command ON interactions (command, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_interactions_user ON interactions (user_id, timestamp)")
+    return conn
+
+def _migrate_csv(conn):
+    """ייבוא חד-פעמי של קובץ ה-CSV הישן; הקובץ משנה שם אחרי הייבוא"""
+    if not os.path.exists(LOG_FILE):
+        return
+    with open(LOG_FILE, newline='', encoding='utf-8') as f:
+        rows = [(r.get('user_id'), r.get('command'), r.get('username') or "N/A", r.get('timestamp')) for r in csv.DictReader(f)]
+    with _write_lock, conn:
+        conn.executemany("INSERT INTO interactions (user_id, command, username, timestamp) VALUES (?, ?, ?, ?)", rows)
+    os.replace(LOG_FILE, LOG_FILE + ".migrated")
+    logger.info(f"{len(rows)} רשומות יובאו מ-{LOG_FILE} אל {DB_FILE}")
+
+def _drain(limit=None):
+    batch = []
+    while limit is None or len(batch) < limit:
+        try:
+            batch.append(_buffer.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+def _write(batch):
+    if not batch:
+        return
+    with _write_lock, _conn:
+        _conn.executemany("INSERT INTO interactions (user_id, command, username, timestamp) VALUES (?, ?, ?, ?)", batch)
+
+def _save_stats():
+    data = stats.to_json()
+    with _write_lock, _conn:
+        _conn.execute("INSERT OR REPLACE INTO stats_snapshot (id, data) VALUES (1, ?)", (data,))
+
+def _load_stats():
+    """טעינת תמונת המצב האחרונה; אם אין כזו (שדרוג מגרסה קודמת), חישוב חד-פעמי מהלוג ומיזוג עם מה שנרשם בינתיים"""
+    row = _conn.execute("SELECT data FROM stats_snapshot WHERE id = 1").fetchone()
+    if row is not None:
+        loaded = UsageStats.from_json(row[0])
+    else:
+        loaded = UsageStats()
+        with _write_lock:
+            for user_id, command, username, timestamp in _conn.execute("SELECT user_id, command, username, timestamp FROM interactions ORDER BY id"):
+                try:
+                    loaded.record(user_id, command, username, timestamp)
+                except (TypeError, ValueError):
+                    continue
+    stats.absorb_history(loaded)
+    _save_stats()
+
+def _run_flusher():
+    try:
+        _migrate_csv(_conn)
+    except Exception as e:
+        logger.error(f"שגיאה בייבוא {LOG_FILE}: {e}")
+    try:
+        _load_stats()
+    except Exception as e:
+        logger.error(f"שגיאה בטעינת סטטיסטיקות השימוש: {e}")
+    last_snapshot = time.monotonic()
+    while True:
+        try:
+            first = _buffer.get(timeout=FLUSH_INTERVAL)
+            _write([first] + _drain(BATCH_SIZE - 1))
+        except queue.Empty:
+            pass
+        except Exception as e:
+            logger.error(f"שגיאה בכתיבת לוג השימוש: {e}")
+        if time.monotonic() - last_snapshot >= STATS_SNAPSHOT_INTERVAL:
+            last_snapshot = time.monotonic()
+            try:
+                _save_stats()
+            except Exception as e:
+                logger.error(f"שגיאה בשמירת סטטיסטיקות השימוש: {e}")
+
+def _ensure_started():
+    global _conn, _flusher
+    if _flusher is None:
+        with _write_lock:
+            if _flusher is None:
+                _conn = _connect()
+                _flusher = threading.Thread(target=_run_flusher, name="usage-log-flusher", daemon=True)
+                _flusher.start()
 
 def log_interaction(user_id, command, username=None):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_data.append({
-        "user_id": user_id,
-        "command": command,
-        "username": username if username else "N/A",
-        "timestamp": timestamp
-    })
-
-def save_log_to_file():
-    """שמור את log_data לקובץ CSV"""
-    df = pd.DataFrame(log_data)
-    df.to_csv(LOG_FILE, index=False)
-
-def save_to_excel(filename="bot_usage.xlsx"):
-    df = pd.DataFrame(log_data)
-    df.to_excel(filename, index=False)
-    save_log_to_file()  # גיבוי ל-CSV בזמן ההורדה
-    return filename
-
-# שמור את הלוג לקובץ כשהתוכנית נסגרת (למשל, ב-Deploy חדש)
-atexit.register(save_log_to_file)
+    global dropped
+    _ensure_started()
+    now = time.time()
+    timestamp = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+    stats.record(user_id, command, username, timestamp, now)
+    try:
+        _buffer.put_nowait((user_id, command, username if username else "N/A", timestamp))
+    except queue.Full:
+        dropped += 1
+        if dropped % 1000 == 1:
+            logger.warning(f"חוצץ לוג השימוש מלא, {dropped} רשומות נזרקו")
+
+def flush():
+    """כתיבה מיידית של כל מה שממתין בחוצץ"""
+    _ensure_started()
+    _write(_drain())
+
+def _next_day(date_str):
+    return (datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+def iter_rows(date_from=None, date_to=None, command=None, user=None, limit=None, batch_size=1000):
+    """קריאת הלוג מהדיסק במקטעים, מהישן לחדש, עם סינון לפי טווח תאריכים (YYYY-MM-DD), פקודה ומשתמש; limit שומר את האחרונות"""
+    flush()
+    clauses, params = [], []
+    if date_from:
+        clauses.append("timestamp >= ?")
+        params.append(datetime.strptime(date_from, "%Y-%m-%d").strftime("%Y-%m-%d"))
+    if date_to:
+        clauses.append("timestamp < ?")
+        params.append(_next_day(date_to))
+    if command:
+        clauses.append("command = ?")
+        params.append(command)
+    if user:
+        if str(user).lstrip('-').isdigit():
+            clauses.append("user_id = ?")
+            params.append(int(user))
+        else:
+            clauses.append("username = ?")
+            params.append(str(user).lstrip('@'))
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    if limit:
+        # עם מגבלה נשמרות השורות החדשות ביותר, ועדיין נכתבות מהישנה לחדשה
+        sql = (f"SELECT user_id, command, username, timestamp FROM ("
+               f"SELECT id, user_id, command, username, timestamp FROM interactions{where} ORDER BY id DESC LIMIT {int(limit)}"
+               f") ORDER BY id")
+    else:
+        sql = f"SELECT user_id, command, username, timestamp FROM interactions{where} ORDER BY id"
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def export_log(filename, fmt="xlsx", **filters):
+    """ייצוא זורם של הלוג לקובץ xlsx (openpyxl במצב write-only) או csv.gz; מחזיר את מספר השורות"""
+    rows = iter_rows(limit=EXPORT_MAX_ROWS, **filters)
+    count = 0
+    if fmt == "xlsx":
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(COLUMNS)
+        for row in rows:
+            sheet.append(row)
+            count += 1
+        workbook.save(filename)
+    elif fmt == "csv":
+        with gzip.open(filename, 'wt', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    else:
+        raise ValueError(f"פורמט לא נתמך: {fmt}")
+    return count
+
+def _flush_on_exit():
+    if _flusher is not None:
+        flush()
+        _save_stats()
+
+# כתוב את מה שנשאר בחוצץ כשהתוכנית נסגרת (למשל, ב-Deploy חדש)
+atexit.register(_flush_on_exit)
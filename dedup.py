@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import os
+import re
+import heapq
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# כמה זמן כותרת נשארת באינדקס
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", str(6 * 3600)))
+# סף דמיון (Jaccard על טריגרמות) שמעליו שתי כותרות נחשבות לאותו סיפור
+SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY", "0.45"))
+# חתימת MinHash: BANDS רצועות של ROWS ערכים; זוג עם דמיון 0.45 נשלף כמועמד בסבירות של כ-97%
+BANDS = 16
+ROWS = 2
+NUM_PERM = BANDS * ROWS
+_MERSENNE = (1 << 61) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), 'big') % _MERSENNE | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), 'big') % _MERSENNE)
+    for i in range(NUM_PERM)
+]
+
+_niqqud = re.compile('[֑-ׇ]')
+_time_prefix = re.compile(r'^\s*\d{1,2}:\d{2}\s*:?\s*')
+_non_word = re.compile(r'[^\w\s]')
+_spaces = re.compile(r'\s+')
+_prefixes = ('ו', 'ה')
+
+def normalize_title(title):
+    """הסרת ניקוד, פיסוק, שעה בתחילת הכותרת ואותיות ו/ה בתחילת מילים ארוכות"""
+    text = _niqqud.sub('', title)
+    text = _time_prefix.sub('', text)
+    text = _non_word.sub(' ', text.lower())
+    words = []
+    for word in _spaces.split(text):
+        if not word:
+            continue
+        if len(word) > 3 and word[0] in _prefixes:
+            word = word[1:]
+        words.append(word)
+    return ' '.join(words)
+
+def shingles(text, size=3):
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def minhash(features):
+    hashes = [_hash64(feature) for feature in features]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS)
+
+def _bands(signature):
+    return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+class Story:
+    """אשכול של כותרות מכמה מקורות שמדווחות על אותו אירוע"""
+
+    __slots__ = ("id", "headlines", "first_seen", "last_seen")
+
+    def __init__(self, story_id, seen_at):
+        self.id = story_id
+        self.headlines = {}
+        self.first_seen = seen_at
+        self.last_seen = seen_at
+
+    @property
+    def sources(self):
+        return {source for source, _ in self.headlines}
+
+    @property
+    def lead(self):
+        """הכותרת המוקדמת ביותר בסיפור משמשת כנציגה שלו"""
+        return min(self.headlines.values(), key=lambda doc: doc.first_seen).article
+
+class _Doc:
+    __slots__ = ("key", "article", "shingles", "signature", "story", "first_seen", "last_seen")
+
+class DedupIndex:
+    """אינדקס הדרגתי של כותרות מנורמלות: MinHash על טריגרמות עם אינדקס רצועות (LSH) לשליפת מועמדים, ואימות ב-Jaccard"""
+
+    def __init__(self, window=DEDUP_WINDOW, threshold=SIMILARITY_THRESHOLD):
+        self.window = window
+        self.threshold = threshold
+        self.version = 0
+        self._docs = {}
+        self._bands = {}
+        self._stories = {}
+        self._expiry = deque()
+        self._next_story = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _candidates(self, signature):
+        found = set()
+        for band in _bands(signature):
+            found.update(self._bands.get(band, ()))
+        return found
+
+    def _best_match(self, doc):
+        best, best_score = None, self.threshold
+        for key in self._candidates(doc.signature):
+            other = self._docs[key]
+            union = len(doc.shingles | other.shingles)
+            score = len(doc.shingles & other.shingles) / union if union else 0.0
+            if score >= best_score:
+                best, best_score = other, score
+        return best
+
+    def _remove(self, doc):
+        del self._docs[doc.key]
+        for band in _bands(doc.signature):
+            bucket = self._bands.get(band)
+            if bucket is not None:
+                bucket.discard(doc.key)
+                if not bucket:
+                    del self._bands[band]
+        story = doc.story
+        story.headlines.pop(doc.key, None)
+        if not story.headlines:
+            del self._stories[story.id]
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        while self._expiry and self._expiry[0][0] < now - self.window:
+            seen_at, key = self._expiry.popleft()
+            doc = self._docs.get(key)
+            if doc is None:
+                continue
+            if doc.last_seen < now - self.window:
+                self._remove(doc)
+                self.version += 1
+            else:
+                self._expiry.append((doc.last_seen, key))
+
+    def add(self, source, article, now=None):
+        """הוספת כותרת (או עדכון last_seen אם כבר קיימת); מחזיר את הסיפור שאליו שויכה"""
+        now = time.time() if now is None else now
+        key = (source, article.get('link') or article.get('title'))
+        doc = self._docs.get(key)
+        if doc is not None:
+            doc.last_seen = now
+            doc.story.last_seen = max(doc.story.last_seen, now)
+            return doc.story
+        normalized = normalize_title(article.get('title', ''))
+        doc = _Doc()
+        doc.key = key
+        doc.article = article
+        doc.shingles = shingles(normalized)
+        doc.signature = minhash(doc.shingles)
+        doc.first_seen = doc.last_seen = now
+        match = self._best_match(doc) if doc.shingles else None
+        if match is not None:
+            story = match.story
+            story.last_seen = now
+        else:
+            story = Story(self._next_story, now)
+            self._next_story += 1
+            self._stories[story.id] = story
+        doc.story = story
+        story.headlines[key] = doc
+        self._docs[key] = doc
+        for band in _bands(doc.signature):
+            self._bands.setdefault(band, set()).add(key)
+        self._expiry.append((now, key))
+        self.version += 1
+        return story
+
+    def add_many(self, source, articles, now=None):
+        now = time.time() if now is None else now
+        self.expire(now)
+        for article in articles:
+            if article.get('title'):
+                self.add(source, article, now)
+
+    def top_stories(self, limit=5):
+        """סיפורים מדורגים לפי מספר המקורות שמדווחים עליהם, ואחר כך לפי עדכניות"""
+        return heapq.nlargest(limit, self._stories.values(), key=lambda s: (len(s.sources), s.last_seen))
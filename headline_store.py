@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+HEADLINES_DB_FILE = os.getenv("HEADLINES_DB_FILE", "headlines.db")
+# כמה ימים נשמרת כותרת מהפעם האחרונה שנראתה
+HEADLINE_RETENTION_DAYS = int(os.getenv("HEADLINE_RETENTION_DAYS", "30"))
+PRUNE_INTERVAL = 3600
+
+class HeadlineStore:
+    """היסטוריית הכותרות בקובץ SQLite: כל כותרת עם המקור, הקישור וזמני הפעם הראשונה והאחרונה שנראתה,
+    ולצדה תמונת המצב האחרונה של כל מקור לחימום המטמון אחרי הפעלה מחדש"""
+
+    def __init__(self, path=HEADLINES_DB_FILE, retention_days=HEADLINE_RETENTION_DAYS):
+        self.retention = retention_days * 24 * 3600
+        self._pruned_at = 0.0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS headlines ("
+            "source TEXT, key TEXT, title TEXT, link TEXT, time TEXT, first_seen REAL, last_seen REAL, "
+            "PRIMARY KEY (source, key))"
+        )
+        # שאילתות חלון זמן: לכל המקורות, או לקבוצת מקורות (מדור); last_seen משמש לניקוי
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_headlines_first_seen ON headlines (first_seen)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_headlines_source_first_seen ON headlines (source, first_seen)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_headlines_last_seen ON headlines (last_seen)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS snapshots (source TEXT PRIMARY KEY, fetched_at REAL, data TEXT)")
+        self.conn.commit()
+
+    @staticmethod
+    def _key(article):
+        link = article.get('link')
+        return link if link and link != '#' else article.get('title')
+
+    def record(self, source, results, now=None):
+        """שמירת תוצאת רענון: עדכון הכותרות הידועות, הוספת החדשות והחלפת תמונת המצב של המקור"""
+        now = time.time() if now is None else now
+        rows = [(source, self._key(article), article.get('title'), article.get('link'), article.get('time'), now, now)
+                for article in results if self._key(article)]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO headlines (source, key, title, link, time, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (source, key) DO UPDATE SET title = excluded.title, time = excluded.time, last_seen = excluded.last_seen",
+                rows
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshots (source, fetched_at, data) VALUES (?, ?, ?)",
+                (source, now, json.dumps(results, ensure_ascii=False))
+            )
+        if now - self._pruned_at >= PRUNE_INTERVAL:
+            self.prune(now)
+
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        self._pruned_at = now
+        with self.conn:
+            removed = self.conn.execute("DELETE FROM headlines WHERE last_seen < ?", (now - self.retention,)).rowcount
+        if removed:
+            logger.info(f"{removed} כותרות ישנות נמחקו מההיסטוריה")
+        return removed
+
+    def snapshots(self):
+        """{מקור: (כותרות, זמן השאיבה)} - התוצאה האחרונה של כל מקור, לחימום המטמון"""
+        return {source: (json.loads(data), fetched_at)
+                for source, fetched_at, data in self.conn.execute("SELECT source, fetched_at, data FROM snapshots")}
+
+    def query(self, since, until=None, sources=None, limit=100):
+        """הכותרות שהופיעו לראשונה בחלון [since, until), מהחדשה לישנה; sources מגביל לקבוצת מקורות"""
+        sql = "SELECT source, title, link, time, first_seen, last_seen FROM headlines WHERE first_seen >= ?"
+        params = [since]
+        if until is not None:
+            sql += " AND first_seen < ?"
+            params.append(until)
+        if sources is not None:
+            sources = list(sources)
+            sql += f" AND source IN ({', '.join('?' * len(sources))})"
+            params.extend(sources)
+        sql += " ORDER BY first_seen DESC LIMIT ?"
+        params.append(int(limit))
+        return [
+            {'source': source, 'title': title, 'link': link, 'time': headline_time, 'first_seen': first_seen, 'last_seen': last_seen}
+            for source, title, link, headline_time, first_seen, last_seen in self.conn.execute(sql, params)
+        ]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,143 @@
+import logging
+import os
+import time
+from functools import lru_cache
+
+import lxml.html
+from lxml import etree
+from cssselect import HTMLTranslator
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# lxml (ברירת מחדל) או bs4 - המסלול הישן עם html.parser
+BACKEND = os.getenv("HTML_PARSER_BACKEND", "lxml")
+# מריץ את שני המסלולים ומשווה; אם יש הבדל, המקור עובר לצמיתות ל-html.parser
+VERIFY = os.getenv("HTML_PARSER_VERIFY", "0") == "1"
+# כמה תווים מפענחים החל מהעוגן כשמפענחים רק את תת-העץ הרלוונטי
+PARTIAL_WINDOW = int(os.getenv("HTML_PARTIAL_WINDOW", "60000"))
+
+_translator = HTMLTranslator()
+_utf8_parser = lxml.html.HTMLParser(encoding='utf-8', remove_comments=True)
+_text_xpath = etree.XPath('.//text()[not(ancestor::script) and not(ancestor::style)]')
+_fallback_sources = set()
+
+class Selector:
+    """סלקטור CSS שמקומפל פעם אחת, גם ל-XPath של lxml וגם כמחרוזת ל-BeautifulSoup"""
+
+    __slots__ = ("css", "xpath")
+
+    def __init__(self, css):
+        self.css = css
+        self.xpath = etree.XPath(_translator.css_to_xpath(css, prefix='descendant::'))
+
+@lru_cache(maxsize=None)
+def compile_selector(css):
+    return Selector(css)
+
+def partial_region(html, anchor, window=None):
+    """החלק של העמוד שהפענוח החלקי קורא: מתחילת התגית שמכילה את העוגן ועוד window תווים; בלי עוגן - כל העמוד"""
+    if anchor:
+        start = html.find(anchor)
+        if start != -1:
+            start = max(html.rfind('<', 0, start), 0)
+            return html[start:start + (window or PARTIAL_WINDOW)]
+    return html
+
+class LxmlBackend:
+    name = 'lxml'
+
+    def parse(self, html, anchor=None, window=None):
+        html = partial_region(html, anchor, window)
+        if not html.strip():
+            return None
+        return lxml.html.document_fromstring(html.encode('utf-8'), parser=_utf8_parser)
+
+    def select(self, node, selector):
+        return selector.xpath(node)
+
+    def select_one(self, node, selector):
+        found = selector.xpath(node)
+        return found[0] if found else None
+
+    def text(self, node):
+        return ''.join(part.strip() for part in _text_xpath(node))
+
+    def raw_text(self, node):
+        return ''.join(_text_xpath(node))
+
+    def attr(self, node, name, default=None):
+        return node.get(name, default)
+
+    def tag(self, node):
+        return node.tag
+
+    def closest(self, node, tag, class_name):
+        for parent in node.iterancestors(tag):
+            if class_name in (parent.get('class') or '').split():
+                return parent
+        return None
+
+class SoupBackend:
+    name = 'bs4'
+
+    def parse(self, html, anchor=None, window=None):
+        # bs4 נטען רק כשצריך את המסלול הישן, כדי לא להאט את עליית הבוט
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(html, 'html.parser')
+
+    def select(self, node, selector):
+        return node.select(selector.css)
+
+    def select_one(self, node, selector):
+        return node.select_one(selector.css)
+
+    def text(self, node):
+        return node.get_text(strip=True)
+
+    def raw_text(self, node):
+        return node.text
+
+    def attr(self, node, name, default=None):
+        return node.get(name, default)
+
+    def tag(self, node):
+        return node.name
+
+    def closest(self, node, tag, class_name):
+        return node.find_parent(tag, class_=class_name)
+
+lxml_backend = LxmlBackend()
+soup_backend = SoupBackend()
+
+def _extract(backend, html, extract, anchor=None, window=None):
+    root = backend.parse(html, anchor, window)
+    if root is None:
+        return []
+    return extract(backend, root)
+
+def parse_page(name, html, extract, anchor=None, window=None):
+    """מריץ את extract(backend, root) על העמוד; lxml על תת-העץ של העוגן, עם נפילה ל-html.parser.
+    מחזיר (תוצאות, partial) - partial אומר שהתוצאות נקבעו רק לפי partial_region(html, anchor, window)"""
+    started = time.perf_counter()
+    try:
+        return _parse_page(name, html, extract, anchor, window)
+    finally:
+        metrics.parse_seconds.observe(time.perf_counter() - started, name)
+
+def _parse_page(name, html, extract, anchor, window):
+    if BACKEND == 'bs4' or name in _fallback_sources:
+        return _extract(soup_backend, html, extract), False
+    results = _extract(lxml_backend, html, extract, anchor, window)
+    partial = bool(results and anchor)
+    if not results and anchor:
+        # העוגן הופיע קודם במקום אחר (למשל בסקריפט) - מפענחים את כל המסמך
+        results = _extract(lxml_backend, html, extract)
+    if VERIFY or not results:
+        expected = _extract(soup_backend, html, extract)
+        if expected != results:
+            logger.warning(f"פענוח lxml של {name} שונה מ-html.parser, עוברים למסלול הישן עבור מקור זה")
+            _fallback_sources.add(name)
+            return expected, False
+    return results, partial
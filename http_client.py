@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import time
+
+import aiohttp
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# מגבלות חיבורים: סה"כ ולכל אתר בנפרד, כדי לא להציף אתר אחד ולא לפתוח חיבור חדש בכל בקשה
+CONNECTION_LIMIT = int(os.getenv("HTTP_CONNECTION_LIMIT", "50"))
+CONNECTION_LIMIT_PER_HOST = int(os.getenv("HTTP_CONNECTION_LIMIT_PER_HOST", "4"))
+DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+KEEPALIVE_TIMEOUT = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5, sock_read=10)
+# כותרות ברירת מחדל של דפדפן לכל הבקשות לאתרי החדשות
+BASE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9,he;q=0.8',
+    'Referer': 'https://www.google.com/',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+_session = None
+# מצב אחרון לכל כתובת: ETag/Last-Modified, גיבוב התוכן ותוצאת הפענוח
+_validators = {}
+
+def get_session():
+    """מחזיר את ה-ClientSession המשותף, ויוצר אותו בפעם הראשונה בתוך לולאת האירועים הנוכחית"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+        logger.info(f"HTTP pool created (limit={CONNECTION_LIMIT}, per host={CONNECTION_LIMIT_PER_HOST}, dns ttl={DNS_CACHE_TTL}s)")
+    return _session
+
+def _timeout(seconds):
+    if seconds is None:
+        return DEFAULT_TIMEOUT
+    return aiohttp.ClientTimeout(total=seconds, connect=min(5, seconds))
+
+async def fetch_text(url, headers=None, timeout=None):
+    session = get_session()
+    started = time.perf_counter()
+    try:
+        async with session.get(url, headers=headers, timeout=_timeout(timeout)) as response:
+            logger.debug(f"GET {url} -> {response.status}")
+            response.raise_for_status()
+            return await response.text()
+    finally:
+        metrics.observe_fetch(time.perf_counter() - started)
+
+async def fetch_json(url, headers=None, timeout=None):
+    session = get_session()
+    started = time.perf_counter()
+    try:
+        async with session.get(url, headers=headers, timeout=_timeout(timeout)) as response:
+            logger.debug(f"GET {url} -> {response.status}")
+            response.raise_for_status()
+            return await response.json(content_type=None)
+    finally:
+        metrics.observe_fetch(time.perf_counter() - started)
+
+class _PageState:
+    __slots__ = ("etag", "last_modified", "digest", "partial", "parsed")
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
+        self.partial = False
+        self.parsed = None
+
+def _digest(text, region=None):
+    """גיבוב של הטקסט שהפענוח קרא: רק region(text) אם הפענוח היה חלקי, כדי שפרסומות וחותמות זמן
+    בשאר העמוד לא ישברו את ההשוואה; אחרת כל העמוד"""
+    if region is not None:
+        text = region(text)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+async def fetch_parsed(url, parse, headers=None, timeout=None, region=None):
+    """GET מותנה: 304 או תוכן שלא השתנה מחזירים את תוצאת הפענוח הקודמת בלי להריץ את parse (async) שוב.
+    parse מחזירה (תוצאה, partial); כש-partial, רק region(text) - החלק שהפענוח קרא - קובע אם העמוד השתנה"""
+    state = _validators.get(url)
+    request_headers = dict(headers or {})
+    if state is not None and state.parsed is not None:
+        if state.etag:
+            request_headers['If-None-Match'] = state.etag
+        if state.last_modified:
+            request_headers['If-Modified-Since'] = state.last_modified
+    session = get_session()
+    started = time.perf_counter()
+    try:
+        async with session.get(url, headers=request_headers, timeout=_timeout(timeout)) as response:
+            logger.debug(f"GET {url} -> {response.status}")
+            if response.status == 304 and state is not None and state.parsed is not None:
+                return state.parsed
+            response.raise_for_status()
+            body = await response.read()
+            encoding = response.get_encoding()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+    finally:
+        metrics.observe_fetch(time.perf_counter() - started)
+    text = body.decode(encoding, errors='replace')
+    if state is not None and state.parsed is not None and state.digest == _digest(text, region if state.partial else None):
+        logger.debug(f"Content of {url} unchanged, skipping parse")
+        state.etag, state.last_modified = etag, last_modified
+        return state.parsed
+    parsed, partial = await parse(text)
+    partial = partial and region is not None
+    if state is None:
+        state = _validators[url] = _PageState()
+    state.etag, state.last_modified, state.parsed = etag, last_modified, parsed
+    state.digest, state.partial = _digest(text, region if partial else None), partial
+    return parsed
+
+async def close():
+    """סגירת מאגר החיבורים; נקרא מ-post_shutdown של הבוט"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("HTTP pool closed")
+    _session = None
@@ -0,0 +1,209 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# כל כמה שניות נמדד העיכוב של לולאת האירועים
+LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+# מחרוזות שגיאה נשמרות כתווית; מגבילים את האורך ואת מספר הערכים השונים לכל מקור
+MAX_ERROR_LABEL = 80
+MAX_ERRORS_PER_SOURCE = 20
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30)
+
+# המקור שהקוד הנוכחי עובד עבורו; נקבע ברענון המטמון ועובר גם ל-asyncio.to_thread
+current_source = contextvars.ContextVar("current_source", default=None)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+class Gauge(_Metric):
+    """ערך נוכחי; אפשר לקבוע אותו ישירות או לחשב אותו רק בזמן הייצוא דרך collect"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        super().__init__(name, help_text, labels)
+        self.collect = collect
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def render(self):
+        lines = self.header()
+        values = self.collect() if self.collect else self._values
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # מונה לכל דלי (לא מצטבר), ועוד סכום וספירה
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+fetch_seconds = registry.register(Histogram("newsbot_source_fetch_seconds", "Network time spent fetching a source", ("source",)))
+parse_seconds = registry.register(Histogram("newsbot_source_parse_seconds", "Time spent parsing a source's HTML", ("source",)))
+refresh_seconds = registry.register(Histogram("newsbot_source_refresh_seconds", "End-to-end refresh time of a source", ("source",)))
+refreshes_total = registry.register(Counter("newsbot_source_refreshes_total", "Source refreshes by outcome", ("source", "outcome")))
+errors_total = registry.register(Counter("newsbot_source_errors_total", "Errors returned by scrapers", ("source", "error")))
+cache_requests_total = registry.register(Counter("newsbot_cache_requests_total", "Headline cache lookups by result", ("source", "result")))
+throttled_total = registry.register(Counter("newsbot_throttled_total", "Repeated button presses dropped by the per-user throttle", ("handler",)))
+handler_seconds = registry.register(Histogram("newsbot_handler_seconds", "Handler latency from dispatch to reply", ("handler",)))
+handler_errors_total = registry.register(Counter("newsbot_handler_errors_total", "Handlers that raised", ("handler",)))
+circuit_open = registry.register(Gauge("newsbot_circuit_open", "1 while a source's circuit is open or probing", ("source",)))
+fetch_timeout_seconds = registry.register(Gauge("newsbot_source_timeout_seconds", "Current adaptive refresh timeout of a source", ("source",)))
+loop_lag_seconds = registry.register(Histogram("newsbot_event_loop_lag_seconds", "Event loop scheduling delay", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)))
+loop_lag_current = registry.register(Gauge("newsbot_event_loop_lag_current_seconds", "Most recent event loop scheduling delay"))
+
+def _hit_ratios():
+    totals = {}
+    for (source, result), count in list(cache_requests_total._values.items()):
+        hits, lookups = totals.get(source, (0, 0))
+        totals[source] = (hits + (count if result not in ("miss", "coalesced") else 0), lookups + count)
+    return {(source,): hits / lookups for source, (hits, lookups) in totals.items() if lookups}
+
+cache_hit_ratio = registry.register(Gauge("newsbot_cache_hit_ratio", "Share of cache lookups answered without waiting for a fetch", ("source",), collect=_hit_ratios))
+startup_seconds = registry.register(Gauge("newsbot_startup_seconds", "Seconds from process start to the end of each startup phase", ("phase",)))
+parse_worker_restarts_total = registry.register(Counter("newsbot_parse_worker_restarts_total", "Times the parse worker pool was replaced after a crash or a stuck parse"))
+
+_error_labels = {}
+
+def record_error(source, error):
+    """סופר שגיאה של מקור; מחרוזות חדשות מעבר למגבלה נספרות תחת 'other'"""
+    label = str(error)[:MAX_ERROR_LABEL]
+    seen = _error_labels.setdefault(source, set())
+    if label not in seen:
+        if len(seen) >= MAX_ERRORS_PER_SOURCE:
+            label = "other"
+        seen.add(label)
+    errors_total.inc(source, label)
+
+def observe_fetch(seconds):
+    source = current_source.get()
+    if source is not None:
+        fetch_seconds.observe(seconds, source)
+
+def timed_handler(name):
+    """דקורטור למדידת זמן הטיפול ב-handler של הבוט"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                handler_errors_total.inc(name)
+                raise
+            finally:
+                handler_seconds.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorator
+
+_lag_task = None
+
+async def _monitor_loop_lag(interval):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        loop_lag_seconds.observe(lag)
+        loop_lag_current.set(lag)
+
+def start_loop_monitor(interval=LOOP_LAG_INTERVAL):
+    global _lag_task
+    if _lag_task is None or _lag_task.done():
+        _lag_task = asyncio.ensure_future(_monitor_loop_lag(interval))
+
+async def stop_loop_monitor():
+    global _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        try:
+            await _lag_task
+        except asyncio.CancelledError:
+            pass
+        _lag_task = None
+
+def render():
+    return registry.render()
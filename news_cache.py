@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import time
+
+import metrics
+from circuit_breaker import CircuitBreaker, CLOSED, MAX_TIMEOUT, UNAVAILABLE_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+# מדיניות "הגש ישן בזמן רענון": כשהרשומה פגה, מחזירים את הנתונים הקיימים מיד ומרעננים ברקע
+SERVE_STALE = os.getenv("CACHE_SERVE_STALE", "1") != "0"
+# אחרי כמה שניות נתונים ישנים כבר לא מוגשים, והמשתמש ממתין לרענון
+MAX_STALE_SECONDS = int(os.getenv("CACHE_MAX_STALE", "900"))
+# כל כמה שניות הרענן ברקע בודק אילו מקורות פגו
+REFRESH_TICK = int(os.getenv("CACHE_REFRESH_TICK", "5"))
+DEFAULT_TTL = 60
+
+class CacheEntry:
+    """תוצאה שמורה של מקור אחד, עם מטא-דאטה על עדכניות"""
+
+    __slots__ = ("results", "error", "fetched_at", "checked_at", "duration", "ttl")
+
+    def __init__(self, results, error, fetched_at, checked_at, duration, ttl):
+        self.results = results
+        self.error = error
+        self.fetched_at = fetched_at
+        self.checked_at = checked_at
+        self.duration = duration
+        self.ttl = ttl
+
+    @property
+    def age(self):
+        if self.fetched_at is None:
+            return float("inf")
+        return time.monotonic() - self.fetched_at
+
+    @property
+    def is_fresh(self):
+        return self.age < self.ttl
+
+    @property
+    def is_stale(self):
+        return not self.is_fresh
+
+class HeadlineCache:
+    """מטמון כותרות משותף לכל המקורות, עם TTL לכל מקור ורענון ברקע"""
+
+    def __init__(self, serve_stale=SERVE_STALE, max_stale=MAX_STALE_SECONDS):
+        self.serve_stale = serve_stale
+        self.max_stale = max_stale
+        self._sources = {}
+        self._entries = {}
+        self._inflight = {}
+        self._refresher = None
+        self._listeners = []
+        self._breakers = {}
+
+    def register(self, name, fetch, ttl=DEFAULT_TTL, max_timeout=MAX_TIMEOUT):
+        """רישום מקור: fetch יכולה להיות פונקציה רגילה או async, ולהחזיר רשימה או (רשימה, שגיאה)"""
+        self._sources[name] = (fetch, ttl)
+        self._breakers[name] = CircuitBreaker(name, max_timeout=max_timeout)
+
+    def add_listener(self, callback):
+        """callback(name, results) נקרא אחרי כל רענון מוצלח של מקור"""
+        self._listeners.append(callback)
+
+    def prime(self, name, results, age):
+        """טעינת תוצאה שנשמרה קודם (למשל בהפעלה מחדש); לפי age בשניות היא טרייה או ישנה. תוצאה ישנה מ-max_stale לא נטענת"""
+        if name not in self._sources or not results or name in self._entries or age >= self.max_stale:
+            return False
+        _, ttl = self._sources[name]
+        fetched_at = time.monotonic() - max(age, 0.0)
+        self._entries[name] = CacheEntry(results, None, fetched_at, fetched_at, 0.0, ttl)
+        return True
+
+    async def _call(self, fetch):
+        if asyncio.iscoroutinefunction(fetch):
+            result = await fetch()
+        else:
+            result = await asyncio.to_thread(fetch)
+        if isinstance(result, tuple):
+            return result
+        return result, None if result else "לא ניתן לטעון כרגע"
+
+    async def _refresh(self, name):
+        fetch, ttl = self._sources[name]
+        breaker = self._breakers[name]
+        timeout = breaker.timeout()
+        # המשימה רצה בהקשר משלה, כך שהמקור נראה רק לקוד שהרענון הזה מריץ
+        metrics.current_source.set(name)
+        started = time.monotonic()
+        try:
+            results, error = await asyncio.wait_for(self._call(fetch), timeout)
+        except asyncio.TimeoutError:
+            # פונקציה רגילה ממשיכה לרוץ בתהליכון שלה עד שתסתיים, אבל אף אחד כבר לא ממתין לה
+            logger.warning(f"רענון {name} חרג מהזמן הקצוב של {timeout:.1f} שניות")
+            results, error = [], f"המקור לא הגיב תוך {timeout:.0f} שניות"
+        except Exception as e:
+            logger.error(f"שגיאה ברענון המטמון עבור {name}: {e}")
+            results, error = [], f"שגיאה לא ידועה: {str(e)}"
+        now = time.monotonic()
+        if results:
+            breaker.record_success(now - started)
+        else:
+            breaker.record_failure()
+        previous = self._entries.get(name)
+        if results or previous is None or not previous.results or previous.age >= self.max_stale:
+            # כותרות ישנות מ-max_stale לא נשמרות אחרי כשלון: המדור מציג את השגיאה ולא חדשות של אתמול
+            entry = CacheEntry(results, error, now, now, now - started, ttl)
+        else:
+            # רענון נכשל: שומרים את הכותרות הקודמות ומסמנים את השגיאה האחרונה
+            entry = CacheEntry(previous.results, error, previous.fetched_at, now, now - started, ttl)
+        self._entries[name] = entry
+        metrics.refresh_seconds.observe(entry.duration, name)
+        metrics.refreshes_total.inc(name, "success" if results else "error")
+        if error:
+            metrics.record_error(name, error)
+        if results:
+            for callback in self._listeners:
+                try:
+                    callback(name, results)
+                except Exception as e:
+                    logger.error(f"שגיאה במאזין של המטמון עבור {name}: {e}")
+        logger.debug(f"Cache refresh for {name} took {entry.duration:.2f}s ({len(entry.results)} items, error={error})")
+        return entry
+
+    def refresh(self, name):
+        """מפעיל רענון של מקור (או מצטרף לרענון שכבר רץ) ומחזיר את המשימה"""
+        task = self._inflight.get(name)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._refresh(name))
+            self._inflight[name] = task
+            task.add_done_callback(lambda t, n=name: self._inflight.pop(n, None) if self._inflight.get(n) is t else None)
+        return task
+
+    async def get(self, name):
+        entry = self._entries.get(name)
+        if self._breakers[name].state != CLOSED:
+            # המקור לא זמין: עונים מיד במה שיש, ובדיקות ההתאוששות רצות ברקע
+            metrics.cache_requests_total.inc(name, "unavailable")
+            if entry is not None and entry.results and entry.age < self.max_stale:
+                # הכותרות האחרונות, עם הודעת אי-הזמינות כדי שהמדור יסמן שהן לא מתעדכנות
+                return CacheEntry(entry.results, UNAVAILABLE_MESSAGE, entry.fetched_at, entry.checked_at, entry.duration, entry.ttl)
+            return CacheEntry([], UNAVAILABLE_MESSAGE, None, time.monotonic(), 0.0, 0)
+        if entry is not None and entry.is_fresh:
+            metrics.cache_requests_total.inc(name, "fresh")
+            return entry
+        if entry is not None and entry.results and self.serve_stale and entry.age < self.max_stale:
+            metrics.cache_requests_total.inc(name, "stale")
+            logger.debug(f"Serving stale {name} ({entry.age:.0f}s old) while refreshing")
+            self.refresh(name)
+            return entry
+        # single-flight: קוראים במקביל לאותו מקור ממתינים כולם לאותה שאיבה
+        task = self._inflight.get(name)
+        metrics.cache_requests_total.inc(name, "coalesced" if task is not None and not task.done() else "miss")
+        return await asyncio.shield(self.refresh(name))
+
+    async def _run_refresher(self):
+        while True:
+            for name, (_, ttl) in self._sources.items():
+                entry = self._entries.get(name)
+                breaker = self._breakers[name]
+                # מקור עם מעגל פתוח נבדק לפי זמן ההמתנה של המעגל ולא לפי ה-TTL
+                due = breaker.state != CLOSED or entry is None or time.monotonic() - entry.checked_at >= ttl
+                if due and breaker.allow_request():
+                    self.refresh(name)
+            await asyncio.sleep(REFRESH_TICK)
+
+    def start(self):
+        """הפעלת הרענן ברקע; יש לקרוא מתוך לולאת האירועים של הבוט"""
+        if self._refresher is None or self._refresher.done():
+            logger.info(f"Starting background headline refresher for {len(self._sources)} sources")
+            self._refresher = asyncio.ensure_future(self._run_refresher())
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+        for task in list(self._inflight.values()):
+            task.cancel()
+        self._inflight.clear()
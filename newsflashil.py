@@ -1,18 +1,30 @@
+import startup
 import os
 import time
-import requests
-from bs4 import BeautifulSoup
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-from flask import Flask
-import threading
 import logging
 import asyncio
-from data_logger import log_interaction, save_to_excel
-from sports_scraper import scrape_sport5, scrape_sport1, scrape_one
-from tv_scraper import scrape_keshet12, scrape_reshet13, run_apify_actor
-import signal
-from contextlib import contextmanager
+from datetime import datetime
+import data_logger
+from user_identity import resolve_username
+from rendering import SECTIONS, LOADING_MARKER, BACK_KEYBOARD, render_top_stories, render_history
+from subscriptions import SubscriptionManager, SECTION_TITLES
+from data_logger import log_interaction, export_log
+import tempfile
+from news_cache import HeadlineCache
+from dedup import DedupIndex
+from headline_store import HeadlineStore
+import http_client
+from pipeline import register_sources
+from parse_pool import parse_pool
+from sources import SOURCES, SOURCES_BY_NAME
+import webhook_server
+import metrics
+from metrics import timed_handler
+from throttle import throttled
+
+startup.mark("imports")
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -34,150 +46,131 @@ if not APIFY_API_TOKEN:
     exit(1)
 logger.debug(f"APIFY_API_TOKEN length: {len(APIFY_API_TOKEN)} characters (not showing full token for security)")
 
-NEWS_SITES = {
-    'ynet': 'https://www.ynet.co.il/news',
-    'arutz7': 'https://www.inn.co.il/api/NewAPI/Cat?type=10',
-    'walla': 'https://news.walla.co.il/',
-    'ynet_tech': 'https://www.ynet.co.il/digital/technews',
-    'keshet12': 'https://www.mako.co.il/news-dailynews',
-    'reshet13': 'https://13tv.co.il/_next/data/ObWGmDraUyjZLnpGtZra0/he/news/news-flash.json?all=news&all=news-flash',
-    'channel14': 'https://www.now14.co.il/feed/',
-    'calcalist_tech': 'https://www.calcalist.co.il/calcalistech/category/3778'
-}
-
-BASE_HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    'Accept-Language': 'en-US,en;q=0.9,he;q=0.8',
-    'Referer': 'https://www.google.com/',
-    'Connection': 'keep-alive',
-    'Upgrade-Insecure-Requests': '1'
-}
-
-app = Flask(__name__)
-bot_app = Application.builder().token(TOKEN).build()
-
-@contextmanager
-def timeout(seconds):
-    def handler(signum, frame):
-        raise TimeoutError("סקרייפינג נמשך יותר מדי זמן")
-    signal.signal(signal.SIGALRM, handler)
-    signal.alarm(seconds)
-    try:
-        yield
-    finally:
-        signal.alarm(0)
+async def on_startup(application):
+    metrics.start_loop_monitor()
+    # לפני הפעלת הרענון ברקע, כדי שהתהליכים ייווצרו לפני שנפתחים תהליכונים
+    parse_pool.start()
+    warm_start()
+    headline_cache.start()
+    subscription_manager.start()
 
-def scrape_ynet():
-    try:
-        response = requests.get(NEWS_SITES['ynet'], headers=BASE_HEADERS)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return [{'title': item.text.strip(), 'link': item.find('a')['href']} for item in soup.select('div.slotTitle')[:5]]
-    except Exception as e:
-        logger.error(f"שגיאה ב-Ynet: {e}")
-        return []
+async def on_shutdown(application):
+    await subscription_manager.stop()
+    await headline_cache.stop()
+    await metrics.stop_loop_monitor()
+    await http_client.close()
+    parse_pool.stop()
+    headline_store.close()
 
-def scrape_arutz7():
-    try:
-        response = requests.get(NEWS_SITES['arutz7'], headers=BASE_HEADERS)
-        logger.debug(f"Arutz 7 API response status: {response.status_code}")
-        response.raise_for_status()
-        data = response.json()
-        items = data.get('Items', []) if 'Items' in data else data
-        return [
-            {
-                'time': item.get('time', item.get('itemDate', "ללא שעה")[:16].replace('T', ' ')),
-                'title': item.get('title', 'ללא כותרת'),
-                'link': item.get('shotedLink', item.get('link', '#'))
-            } for item in items[:3]
-        ]
-    except Exception as e:
-        logger.error(f"שגיאה בערוץ 7: {e}")
-        return []
+# כתובת חלופית ל-Bot API (למשל שרת מדומה בבדיקות עומס); ברירת המחדל היא api.telegram.org
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
 
-def scrape_walla():
-    try:
-        response = requests.get(NEWS_SITES['walla'], headers=BASE_HEADERS)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        items = soup.select_one('div.top-section-newsflash.no-mobile').select('a') if soup.select_one('div.top-section-newsflash.no-mobile') else []
-        results = []
-        for item in items:
-            title = item.get_text(strip=True)
-            if title in ["מבזקי חדשות", "מבזקים"]:
-                continue
-            if len(title) > 5 and title[2] == ':':
-                title = title[:5] + ": " + title[5:]
-            link = item['href']
-            if not link.startswith('http'):
-                link = f"https://news.walla.co.il{link}"
-            results.append({'title': title, 'link': link})
-        return results[:3]
-    except Exception as e:
-        logger.error(f"שגיאה ב-Walla: {e}")
-        return []
+# כמה עדכונים מטופלים במקביל; ברירת המחדל של הספרייה היא אחד אחרי השני, כך שמשתמש אחד שממתין למקור איטי מעכב את כולם
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
 
-def scrape_ynet_tech():
-    try:
-        response = requests.get(NEWS_SITES['ynet_tech'], headers=BASE_HEADERS, timeout=5)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        articles = soup.select('div.slotView')[:3]
-        results = []
-        for idx, article in enumerate(articles):
-            title_tag = article.select_one('div.slotTitle a')
-            link_tag = title_tag
-            time_tag = article.select_one('span.dateView')
-            title = title_tag.get_text(strip=True) if title_tag else 'ללא כותרת'
-            link = link_tag['href'] if link_tag else '#'
-            article_time = time_tag.get_text(strip=True) if time_tag else 'ללא שעה'
-            if not link.startswith('http'):
-                link = f"https://www.ynet.co.il{link}"
-            results.append({'time': article_time, 'title': title, 'link': link})
-        return results, None
-    except Exception as e:
-        logger.error(f"שגיאה בסקריפינג Ynet Tech: {str(e)}")
-        return [], f"שגיאה לא ידועה: {str(e)}"
+builder = Application.builder().token(TOKEN).post_init(on_startup).post_shutdown(on_shutdown)
+if CONCURRENT_UPDATES > 1:
+    builder = builder.concurrent_updates(CONCURRENT_UPDATES)
+if TELEGRAM_API_BASE_URL:
+    builder = builder.base_url(f"{TELEGRAM_API_BASE_URL.rstrip('/')}/bot").base_file_url(f"{TELEGRAM_API_BASE_URL.rstrip('/')}/file/bot")
+bot_app = builder.build()
+startup.mark("application")
+headline_cache = HeadlineCache()
+dedup_index = DedupIndex()
+# מקורות החדשות הכלליות שמהם נבנים הסיפורים המובילים
+TOP_STORY_SOURCES = frozenset(source.name for source in SOURCES if source.top_story)
+
+def index_headlines(name, results):
+    if name in TOP_STORY_SOURCES:
+        dedup_index.add_many(name, results)
 
-def scrape_calcalist_tech():
+headline_cache.add_listener(index_headlines)
+
+headline_store = HeadlineStore()
+headline_cache.add_listener(headline_store.record)
+
+register_sources(headline_cache, SOURCES)
+
+def warm_start():
+    """טעינת התוצאה האחרונה של כל מקור מההיסטוריה, כך שהמשתמשים הראשונים אחרי Deploy לא ממתינים לשאיבה"""
+    started = time.perf_counter()
+    now = time.time()
+    primed = 0
+    for name, (results, fetched_at) in headline_store.snapshots().items():
+        if headline_cache.prime(name, results, now - fetched_at):
+            primed += 1
+            if name in TOP_STORY_SOURCES:
+                dedup_index.add_many(name, results, now=fetched_at)
+    logger.info(f"Warm start: {primed} sources loaded from the headline store in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+async def get_cached(name):
+    entry = await headline_cache.get(name)
+    if entry.is_stale:
+        logger.debug(f"Answering {name} from stale cache ({entry.age:.0f}s old)")
+    return entry.results, entry.error
+
+async def get_with_deadline(name):
+    deadline = SOURCES_BY_NAME[name].deadline
     try:
-        response = requests.get(NEWS_SITES['calcalist_tech'], headers=BASE_HEADERS, timeout=5)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # ניסיון לשאוב כתבות לפי מבנה אפשרי של כלכליסט
-        articles = soup.select('div.teaser')[:3]  # התאמה זמנית - יש לבדוק את ה-HTML האמיתי
-        if not articles:
-            articles = soup.select('a[href*="/calcalistech/article"]')[:3]  # ניסיון חלופי
-        
-        results = []
-        for article in articles:
-            if article.name == 'a':
-                title_tag = article
-            else:
-                title_tag = article.select_one('a')
-            
-            title = title_tag.get_text(strip=True) if title_tag else 'ללא כותרת'
-            link = title_tag['href'] if title_tag and 'href' in title_tag.attrs else '#'
-            if not link.startswith('http'):
-                link = f"https://www.calcalist.co.il{link}"  # תיקון השורה הבעייתית
-            results.append({'title': title, 'link': link})  # בלי 'time'
-        
-        return results, None
-    except Exception as e:
-        logger.error(f"שגיאה בסקריפינג Calcalist Tech: {str(e)}")
-        return [], f"שגיאה לא ידועה: {str(e)}"
+        return await asyncio.wait_for(get_cached(name), deadline)
+    except asyncio.TimeoutError:
+        # הרענון ממשיך ברקע, והמשתמש הבא יקבל את התוצאה מהמטמון
+        logger.warning(f"{name} did not answer within {deadline}s, marking as loading")
+        return [], LOADING_MARKER
+
+async def fetch_sources(*names):
+    """שאיבה מקבילית של כמה מקורות; זמן התגובה נקבע לפי המקור האיטי ביותר ולא לפי סכומם"""
+    return await asyncio.gather(*(get_with_deadline(name) for name in names))
+
+async def section_payload(section):
+    renderer = SECTIONS[section]
+    return renderer.payload(await fetch_sources(*renderer.sources))
+
+_top_stories_render = (None, None)
+
+def top_stories_text():
+    """ההודעה מרונדרת מחדש רק כשהאינדקס השתנה מאז הפעם הקודמת"""
+    global _top_stories_render
+    version, text = _top_stories_render
+    if version != dedup_index.version:
+        text = render_top_stories(dedup_index.top_stories())
+        _top_stories_render = (dedup_index.version, text)
+    return text
 
+subscription_manager = SubscriptionManager(bot_app.bot, SECTIONS, fetch_sources)
+
+@timed_handler("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    chat = await context.bot.get_chat(user_id)
-    username = chat.username
+    username = resolve_username(update, context)
     logger.debug(f"User {user_id} sent /start, username: {username}")
     log_interaction(user_id, "/start", username)
     await update.message.reply_text("ברוך הבא! השתמש ב-/latest למבזקים.")
 
+DOWNLOAD_FILTER_KEYS = {'from': 'date_from', 'to': 'date_to', 'command': 'command', 'user': 'user', 'format': 'fmt'}
+
+def parse_download_filters(args):
+    """פענוח ארגומנטים מהצורה key=value של /download למסננים של export_log"""
+    filters = {}
+    for arg in args:
+        key, sep, value = arg.partition('=')
+        if not sep or key not in DOWNLOAD_FILTER_KEYS or not value:
+            raise ValueError(f"פרמטר לא מוכר: {arg}")
+        filters[DOWNLOAD_FILTER_KEYS[key]] = value
+    for key in ('date_from', 'date_to'):
+        if key in filters:
+            try:
+                datetime.strptime(filters[key], "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"תאריך לא תקין: {filters[key]}")
+    if filters.get('fmt', 'xlsx') not in ('xlsx', 'csv'):
+        raise ValueError(f"פורמט לא נתמך: {filters['fmt']}")
+    return filters
+
+@timed_handler("download")
 async def download(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    chat = await context.bot.get_chat(user_id)
-    username = chat.username
+    username = resolve_username(update, context)
     logger.debug(f"User {user_id} sent /download, username: {username}")
     log_interaction(user_id, "/download", username)
     SECRET_PASSWORD = os.getenv("DOWNLOAD_PASSWORD")
@@ -191,232 +184,219 @@ async def download(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        filename = save_to_excel()
-        if not os.path.exists(filename):
-            await update.message.reply_text("שגיאה: הקובץ לא נוצר!")
-            return
+        filters = parse_download_filters(context.args[1:])
+    except ValueError as e:
+        await update.message.reply_text(f"{e}\nשימוש: /download <סיסמה> [from=YYYY-MM-DD] [to=YYYY-MM-DD] [command=/latest] [user=<id או שם משתמש>] [format=xlsx|csv]")
+        return
+    
+    fmt = filters.pop('fmt', 'xlsx')
+    suffix = ".xlsx" if fmt == "xlsx" else ".csv.gz"
+    fd, filename = tempfile.mkstemp(prefix="bot_usage_", suffix=suffix)
+    os.close(fd)
+    try:
+        # הייצוא רץ ב-thread נפרד כדי לא לעצור את לולאת האירועים של הבוט
+        count = await asyncio.to_thread(export_log, filename, fmt, **filters)
         with open(filename, 'rb') as file:
-            await update.message.reply_text("הנה הנתונים שלך!")
-            await update.message.reply_document(document=file, filename="bot_usage.xlsx")
-        os.remove(filename)
+            if count >= data_logger.EXPORT_MAX_ROWS:
+                await update.message.reply_text(f"הנה הנתונים שלך! הייצוא הוגבל ל-{count} השורות האחרונות; לתקופות קודמות השתמשו ב-from= וב-to=")
+            else:
+                await update.message.reply_text(f"הנה הנתונים שלך! ({count} שורות)")
+            await update.message.reply_document(document=file, filename=f"bot_usage{suffix}")
     except Exception as e:
         logger.error(f"שגיאה בשליחת הקובץ: {e}")
         await update.message.reply_text(f"שגיאה בהורדה: {str(e)}")
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+SUBSCRIBE_USAGE = "שימוש: /subscribe <מדור>\nמדורים זמינים:\n" + "\n".join(f"{key} - {title}" for key, title in SECTION_TITLES.items())
+
+@timed_handler("subscribe")
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    username = resolve_username(update, context)
+    logger.debug(f"User {user_id} sent /subscribe, username: {username}")
+    log_interaction(user_id, "/subscribe", username)
+    if not context.args or context.args[0] not in SECTION_TITLES:
+        await update.message.reply_text(SUBSCRIBE_USAGE)
+        return
+    section = context.args[0]
+    subscription_manager.store.subscribe(update.effective_chat.id, section)
+    await update.message.reply_text(f"נרשמת לעדכונים: {SECTION_TITLES[section]}. כותרות חדשות יישלחו אליך אוטומטית.")
+
+@timed_handler("unsubscribe")
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    username = resolve_username(update, context)
+    logger.debug(f"User {user_id} sent /unsubscribe, username: {username}")
+    log_interaction(user_id, "/unsubscribe", username)
+    section = context.args[0] if context.args else None
+    if section is not None and section not in SECTION_TITLES:
+        await update.message.reply_text(SUBSCRIBE_USAGE.replace("/subscribe", "/unsubscribe"))
+        return
+    removed = subscription_manager.store.unsubscribe(update.effective_chat.id, section)
+    if not removed:
+        await update.message.reply_text("לא נמצאו הרשמות פעילות.")
+    elif section is None:
+        await update.message.reply_text("כל ההרשמות בוטלו.")
+    else:
+        await update.message.reply_text(f"ההרשמה ל{SECTION_TITLES[section]} בוטלה.")
+
+HISTORY_DEFAULT_HOURS = 2
+HISTORY_MAX_HOURS = 72
+HISTORY_LIMIT = 30
+HISTORY_USAGE = "שימוש: /history <מדור> [שעות]\nמדורים זמינים:\n" + "\n".join(f"{key} - {title}" for key, title in SECTION_TITLES.items())
+
+@timed_handler("history")
+async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    username = resolve_username(update, context)
+    logger.debug(f"User {user_id} sent /history, username: {username}")
+    log_interaction(user_id, "/history", username)
+    args = context.args or []
+    section = args[0] if args else None
+    try:
+        hours = float(args[1]) if len(args) > 1 else HISTORY_DEFAULT_HOURS
+    except ValueError:
+        hours = 0
+    if section not in SECTION_TITLES or not 0 < hours <= HISTORY_MAX_HOURS:
+        await update.message.reply_text(HISTORY_USAGE)
+        return
+    headlines = headline_store.query(time.time() - hours * 3600, sources=SECTIONS[section].sources, limit=HISTORY_LIMIT)
+    await update.message.reply_text(text=render_history(SECTION_TITLES[section], hours, headlines), parse_mode='Markdown', disable_web_page_preview=True)
+
+SECTION_NAMES = {'sports_news': 'ספורט', 'tech_news': 'טכנולוגיה', 'tv_news': 'ערוצי טלוויזיה', 'top_stories': 'סיפורים מובילים'}
 
+@timed_handler("stats")
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.message.from_user.id
+    username = resolve_username(update, context)
+    logger.debug(f"User {user_id} sent /stats, username: {username}")
+    log_interaction(user_id, "/stats", username)
+    SECRET_PASSWORD = os.getenv("DOWNLOAD_PASSWORD")
+
+    if not SECRET_PASSWORD:
+        await update.message.reply_text("שגיאה: הסיסמה לא מוגדרת בשרת!")
+        return
+    
+    if not context.args or context.args[0] != SECRET_PASSWORD:
+        await update.message.reply_text("סיסמה שגויה! אין גישה.")
+        return
+    
+    summary = data_logger.stats.summary()
+    message = "📊 סטטיסטיקות שימוש\n\n"
+    message += f"משתמשים פעילים היום: {summary['dau']}\n"
+    message += f"משתמשים פעילים מתחילת השעה הנוכחית: {summary['hau']}\n\n"
+    message += "משתמשים פעילים לפי יום:\n"
+    for day, count in summary['daily'].items():
+        message += f"{day}: {count}\n"
+    message += "\nפקודות:\n"
+    for command, count in summary['commands'].items():
+        message += f"{command}: {count}\n"
+    message += "\nמעבר מהמבזקים למדורים:\n"
+    for command, (clicks, rate) in summary['click_through'].items():
+        message += f"{SECTION_NAMES[command]}: {clicks} ({rate:.1%})\n"
+    message += "\nמשתמשים מובילים:\n"
+    for idx, (top_id, top_name, count) in enumerate(summary['top_users'], 1):
+        message += f"{idx}. {top_name} ({top_id}): {count}\n"
+    await update.message.reply_text(message)
+
+@timed_handler("latest")
+@throttled("latest")
 async def latest(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    chat = await context.bot.get_chat(user_id)
-    username = chat.username
+    username = resolve_username(update, context)
     logger.debug(f"User {user_id} sent /latest, username: {username}")
     log_interaction(user_id, "/latest", username)
     await update.message.reply_text("מחפש מבזקים...")
-    ynet_news = scrape_ynet()
-    arutz7_news = scrape_arutz7()
-    walla_news = scrape_walla()
-
-    news = {'Ynet': ynet_news, 'ערוץ 7': arutz7_news, 'Walla': walla_news}
-    message = "📰 **המבזקים האחרונים** 📰\n\n"
-    for site, articles in news.items():
-        message += f"**{site}:**\n"
-        if articles:
-            for idx, article in enumerate(articles[:3], 1):
-                if 'time' in article:
-                    message += f"{idx}. [{article['time']} - {article['title']}]({article['link']})\n"
-                else:
-                    message += f"{idx}. [{article['title']}]({article['link']})\n"
-        else:
-            message += "לא ניתן לטעון כרגע\n"
-        message += "\n"
-    
-    keyboard = [
-        [InlineKeyboardButton("⚽🏀 חדשות ספורט", callback_data='sports_news')],
-        [InlineKeyboardButton("💻 חדשות טכנולוגיה", callback_data='tech_news')],
-        [InlineKeyboardButton("📺 חדשות מערוצי טלוויזיה", callback_data='tv_news')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    message, reply_markup = await section_payload('latest')
     await update.message.reply_text(text=message, parse_mode='Markdown', disable_web_page_preview=True, reply_markup=reply_markup)
 
+@timed_handler("sports_news")
+@throttled("sports_news")
 async def sports_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
-    chat = await context.bot.get_chat(user_id)
-    username = chat.username
+    username = resolve_username(update, context)
     logger.debug(f"User {user_id} triggered sports_news, username: {username}")
     log_interaction(user_id, "sports_news", username)
     await query.answer()
     await query.message.reply_text("מחפש מבזקי ספורט...")
     
-    sport5_news, sport5_error = scrape_sport5()
-    sport1_news, sport1_error = scrape_sport1()
-    one_news, one_error = scrape_one()
-    
-    message = "**ספורט 5**\n"
-    if sport5_news:
-        for idx, article in enumerate(sport5_news[:3], 1):
-            message += f"{idx}. [{article['title']}]({article['link']})\n"
-    else:
-        message += f"לא ניתן למצוא מבזקים\n**פרטי השגיאה:** {sport5_error}\n"
-    
-    message += "\n**ספורט 1**\n"
-    if sport1_news:
-        for idx, article in enumerate(sport1_news[:3], 1):
-            message += f"{idx}. [{article['title']}]({article['link']})\n"
-    else:
-        message += f"לא ניתן למצוא מבזקים\n**פרטי השגיאה:** {sport1_error}\n"
-    
-    message += "\n**ONE**\n"
-    if one_news:
-        for idx, article in enumerate(one_news[:3], 1):
-            message += f"{idx}. [{article['title']}]({article['link']})\n"
-    else:
-        message += f"לא ניתן למצוא מבזקים\n**פרטי השגיאה:** {one_error}\n"
-    
-    keyboard = [[InlineKeyboardButton("🏠 חזרה לעמוד ראשי", callback_data='latest_news')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    message, reply_markup = await section_payload('sports')
     await query.message.reply_text(text=message, parse_mode='Markdown', disable_web_page_preview=True, reply_markup=reply_markup)
 
+@timed_handler("tech_news")
+@throttled("tech_news")
 async def tech_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
-    chat = await context.bot.get_chat(user_id)
-    username = chat.username
+    username = resolve_username(update, context)
     logger.debug(f"User {user_id} triggered tech_news, username: {username}")
     log_interaction(user_id, "tech_news", username)
     await query.answer()
     await query.message.reply_text("מחפש חדשות טכנולוגיה...")
     
-    ynet_tech_news, ynet_tech_error = scrape_ynet_tech()
-    calcalist_tech_news, calcalist_tech_error = scrape_calcalist_tech()
-    
-    message = "**חדשות טכנולוגיה**\n\n"
-    
-    message += "**Ynet Tech**\n"
-    if ynet_tech_news:
-        for idx, article in enumerate(ynet_tech_news[:3], 1):
-            message += f"{idx}. [{article['time']} - {article['title']}]({article['link']})\n"
-    else:
-        message += f"לא ניתן למצוא מבזקים\n**פרטי השגיאה:** {ynet_tech_error}\n"
-    
-    message += "\n**כלכליסט טק**\n"
-    if calcalist_tech_news:
-        for idx, article in enumerate(calcalist_tech_news[:3], 1):
-            message += f"{idx}. [{article['title']}]({article['link']})\n"  # בלי שעה
-    else:
-        message += f"לא ניתן למצוא מבזקים\n**פרטי השגיאה:** {calcalist_tech_error}\n"
-    
-    keyboard = [[InlineKeyboardButton("🏠 חזרה לעמוד ראשי", callback_data='latest_news')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    message, reply_markup = await section_payload('tech')
     await query.message.reply_text(text=message, parse_mode='Markdown', disable_web_page_preview=True, reply_markup=reply_markup)
 
+@timed_handler("tv_news")
+@throttled("tv_news")
 async def tv_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
-    chat = await context.bot.get_chat(user_id)
-    username = chat.username
+    username = resolve_username(update, context)
     logger.debug(f"User {user_id} triggered tv_news, username: {username}")
     log_interaction(user_id, "tv_news", username)
     await query.answer()
     await query.message.reply_text("מביא חדשות מערוצי טלוויזיה...")
     
-    channel14_news, channel14_error = await run_apify_actor()
-    reshet13_news, reshet13_error = scrape_reshet13()
-    keshet12_news, keshet12_error = scrape_keshet12()
-    
-    message = "**חדשות מערוצי טלוויזיה**\n\n"
-    
-    message += "**עכשיו 14**:\n"
-    if channel14_news:
-        for idx, article in enumerate(channel14_news[:3], 1):
-            if article['link']:
-                message += f"{idx}. [{article['time']} - {article['title']}]({article['link']})\n"
-            else:
-                message += f"{idx}. {article['time']} - {article['title']}\n"
-    else:
-        message += f"לא ניתן למצוא מבזקים\n**פרטי השגיאה:** {channel14_error}\n"
-    
-    message += "\n**קשת 12**:\n"
-    if keshet12_news:
-        for idx, article in enumerate(keshet12_news[:3], 1):
-            if article['link']:
-                message += f"{idx}. [{article['time']} - {article['title']}]({article['link']})\n"
-            else:
-                message += f"{idx}. {article['time']} - {article['title']}\n"
-    else:
-        message += f"לא ניתן למצוא מבזקים\n**פרטי השגיאה:** {keshet12_error}\n"
-    
-    message += "\n**רשת 13**:\n"
-    if reshet13_news:
-        for idx, article in enumerate(reshet13_news[:3], 1):
-            if article['link']:
-                message += f"{idx}. [{article['time']} - {article['title']}]({article['link']})\n"
-            else:
-                message += f"{idx}. {article['time']} - {article['title']}\n"
-    else:
-        message += f"לא ניתן למצוא מבזקים\n**פרטי השגיאה:** {reshet13_error}\n"
-    
-    keyboard = [[InlineKeyboardButton("🏠 חזרה לעמוד ראשי", callback_data='latest_news')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    message, reply_markup = await section_payload('tv')
     await query.message.reply_text(text=message, parse_mode='Markdown', disable_web_page_preview=True, reply_markup=reply_markup)
 
+@timed_handler("latest_news")
+@throttled("latest_news")
 async def latest_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
-    chat = await context.bot.get_chat(user_id)
-    username = chat.username
+    username = resolve_username(update, context)
     logger.debug(f"User {user_id} triggered latest_news, username: {username}")
     log_interaction(user_id, "latest_news", username)
     await query.answer()
     
-    ynet_news = scrape_ynet()
-    arutz7_news = scrape_arutz7()
-    walla_news = scrape_walla()
-
-    news = {'Ynet': ynet_news, 'ערוץ 7': arutz7_news, 'Walla': walla_news}
-    message = "📰 **המבזקים האחרונים** 📰\n\n"
-    for site, articles in news.items():
-        message += f"**{site}:**\n"
-        if articles:
-            for idx, article in enumerate(articles[:3], 1):
-                if 'time' in article:
-                    message += f"{idx}. [{article['time']} - {article['title']}]({article['link']})\n"
-                else:
-                    message += f"{idx}. [{article['title']}]({article['link']})\n"
-        else:
-            message += "לא ניתן לטעון כרגע\n"
-        message += "\n"
-    
-    keyboard = [
-        [InlineKeyboardButton("⚽🏀 חדשות ספורט", callback_data='sports_news')],
-        [InlineKeyboardButton("💻 חדשות טכנולוגיה", callback_data='tech_news')],
-        [InlineKeyboardButton("📺 חדשות מערוצי טלוויזיה", callback_data='tv_news')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    message, reply_markup = await section_payload('latest')
     await query.message.reply_text(text=message, parse_mode='Markdown', disable_web_page_preview=True, reply_markup=reply_markup)
 
-@app.route('/')
-def home():
-    logger.debug("Flask server accessed")
-    return "Bot is alive!"
+@timed_handler("top_stories")
+@throttled("top_stories")
+async def top_stories(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = query.from_user.id
+    username = resolve_username(update, context)
+    logger.debug(f"User {user_id} triggered top_stories, username: {username}")
+    log_interaction(user_id, "top_stories", username)
+    await query.answer()
 
-def run_flask():
-    port = int(os.environ.get("PORT", 10000))
-    logger.info(f"Starting Flask on port {port}")
-    app.run(host="0.0.0.0", port=port)
+    await query.message.reply_text(text=top_stories_text(), parse_mode='Markdown', disable_web_page_preview=True, reply_markup=BACK_KEYBOARD)
+
+def register_handlers(application):
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("latest", latest))
+    application.add_handler(CommandHandler("download", download))
+    application.add_handler(CommandHandler("stats", stats))
+    application.add_handler(CommandHandler("subscribe", subscribe))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe))
+    application.add_handler(CommandHandler("history", history))
+    application.add_handler(CallbackQueryHandler(sports_news, pattern='sports_news'))
+    application.add_handler(CallbackQueryHandler(tech_news, pattern='tech_news'))
+    application.add_handler(CallbackQueryHandler(tv_news, pattern='tv_news'))
+    application.add_handler(CallbackQueryHandler(latest_news, pattern='latest_news'))
+    application.add_handler(CallbackQueryHandler(top_stories, pattern='top_stories'))
 
 if __name__ == "__main__":
     logger.info("Initializing bot...")
-    bot_app.add_handler(CommandHandler("start", start))
-    bot_app.add_handler(CommandHandler("latest", latest))
-    bot_app.add_handler(CommandHandler("download", download))
-    bot_app.add_handler(CallbackQueryHandler(sports_news, pattern='sports_news'))
-    bot_app.add_handler(CallbackQueryHandler(tech_news, pattern='tech_news'))
-    bot_app.add_handler(CallbackQueryHandler(tv_news, pattern='tv_news'))
-    bot_app.add_handler(CallbackQueryHandler(latest_news, pattern='latest_news'))
-
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-
-    logger.info("Starting bot polling in main thread...")
-    bot_app.run_polling(allowed_updates=Update.ALL_TYPES)
+    register_handlers(bot_app)
+
+    logger.info(f"Starting bot in {webhook_server.BOT_MODE} mode...")
+    webhook_server.run(bot_app)
     logger.info("Bot polling started successfully")
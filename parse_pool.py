@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# מספר תהליכי הפענוח; 0 מפענח בתוך תהליך הבוט כמו קודם
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+# פענוח שנתקע יותר מזה נחשב לתקלה, והתהליכים מוחלפים
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "10"))
+
+def _init_worker():
+    # התהליך יורש את ה-wakeup fd של לולאת הבוט; בלי הניתוק, SIGTERM לתהליך פענוח היה מכבה את הבוט עצמו
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ctrl+C מגיע לכל קבוצת התהליכים; הבוט הוא שסוגר את המאגר
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _parse(name, html):
+    """רץ בתהליך הפענוח: מחזיר רק את רשומות הכותרות (title/link/time) עם דגל partial ואת זמן הפענוח, לא את עץ ה-DOM"""
+    from sources import SOURCES_BY_NAME
+
+    started = time.perf_counter()
+    results = SOURCES_BY_NAME[name].parse_page(html)
+    return results, time.perf_counter() - started
+
+class ParsePool:
+    """מאגר תהליכים לפענוח HTML, כדי שפענוח עמודים גדולים לא יתחרה ב-GIL של לולאת הבוט.
+    השאיבה נשארת בבוט (חיבורים, ETag ועוגיות משותפים); לתהליכים נשלח רק הטקסט.
+    תהליך שקרס או פענוח שנתקע מחליפים את כל המאגר, והבקשה הנוכחית נכשלת כרגיל דרך המפסק של המקור."""
+
+    def __init__(self, workers=PARSE_WORKERS, timeout=PARSE_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+
+    def start(self):
+        if self.workers <= 0 or self._executor is not None:
+            return
+        # fork ולא spawn: spawn מייבא מחדש את newsflashil בכל תהליך, על כל תופעות הלוואי שלו.
+        # המאגר נוצר ב-post_init, לפני שנפתחים תהליכונים ברקע
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker
+        )
+        # עם fork כל התהליכים נוצרים בהגשה הראשונה, ולכן מגישים אחת כבר עכשיו
+        self._executor.submit(os.getpid)
+        logger.info(f"Parse pool started with {self.workers} workers")
+
+    def _restart(self, executor, reason):
+        # רק הקריאה הראשונה שנתקלה בתקלה מחליפה את המאגר; השאר כבר מקבלות את החדש
+        if self._executor is not executor:
+            return
+        metrics.parse_worker_restarts_total.inc()
+        logger.error(f"מאגר הפענוח מופעל מחדש ({reason})")
+        # אין API ציבורי להריגת תהליך תקוע, ו-shutdown לבדו היה משאיר אותו רץ
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            if process.is_alive():
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.start()
+
+    async def parse(self, name, html):
+        executor = self._executor
+        if executor is None:
+            # המאגר כבוי (PARSE_WORKERS=0) או לא הופעל, למשל בבנצ'מרק
+            return _parse(name, html)[0]
+        try:
+            results, seconds = await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(executor, _parse, name, html), self.timeout)
+        except asyncio.TimeoutError:
+            reason = f"פענוח {name} נמשך יותר מ-{self.timeout:.0f} שניות"
+            self._restart(executor, reason)
+            raise asyncio.TimeoutError(reason) from None
+        except BrokenProcessPool:
+            self._restart(executor, f"תהליך קרס בזמן פענוח {name}")
+            raise
+        metrics.parse_seconds.observe(seconds, name)
+        return results
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Parse pool stopped")
+
+parse_pool = ParsePool()
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+from urllib.parse import urljoin
+
+import http_client
+import html_parsing
+from html_parsing import compile_selector
+from parse_pool import parse_pool
+from sports_scraper import session_pool
+
+logger = logging.getLogger(__name__)
+
+NO_TITLE = 'ללא כותרת'
+NO_TIME = 'ללא שעה'
+
+class Field:
+    """שדה ב-HTML: סלקטור יחסי לפריט (None - הפריט עצמו), טקסט או מאפיין, ותיקון אופציונלי של הערך"""
+
+    __slots__ = ("selector", "attr", "index", "raw", "closest", "self_tag", "transform")
+
+    def __init__(self, css=None, attr=None, index=0, raw=False, closest=None, self_tag=None, transform=None):
+        self.selector = compile_selector(css) if css else None
+        self.attr = attr
+        self.index = index
+        self.raw = raw
+        # (תגית, מחלקה) של הורה שממנו לוקחים את הערך, למשל קישור שעוטף את הכרטיס
+        self.closest = closest
+        # אם הפריט עצמו הוא התגית הזו, לוקחים ממנו ולא מחפשים בתוכו
+        self.self_tag = self_tag
+        self.transform = transform
+
+    def node(self, p, item):
+        if self.closest:
+            return p.closest(item, *self.closest)
+        if self.selector is None or (self.self_tag and p.tag(item) == self.self_tag):
+            return item
+        if self.index == 0:
+            return p.select_one(item, self.selector)
+        found = p.select(item, self.selector)
+        return found[self.index] if len(found) > self.index else None
+
+    def extract(self, p, item):
+        node = self.node(p, item)
+        if node is None:
+            return None
+        if self.attr:
+            value = p.attr(node, self.attr)
+        else:
+            value = p.raw_text(node).strip() if self.raw else p.text(node)
+        if value is not None and self.transform:
+            value = self.transform(value)
+        return value
+
+class JsonField:
+    """שדה ב-JSON: המפתח הראשון שקיים מבין keys, עם תיקון אופציונלי של הערך"""
+
+    __slots__ = ("keys", "transform")
+
+    def __init__(self, *keys, transform=None):
+        self.keys = keys
+        self.transform = transform
+
+    def extract(self, item):
+        for key in self.keys:
+            if key in item:
+                value = item[key]
+                if value is not None and self.transform:
+                    try:
+                        value = self.transform(value)
+                    except (TypeError, ValueError, IndexError, AttributeError):
+                        return None
+                return value
+        return None
+
+def _resolve(data, path):
+    for key in path:
+        if isinstance(key, int):
+            if not isinstance(data, list) or len(data) <= key:
+                return None
+        elif not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+class Source:
+    """הגדרה הצהרתית של מקור: כתובת, אסטרטגיית שאיבה, סלקטורים או נתיבי JSON, ומיפוי לשדות הכותרת"""
+
+    def __init__(self, name, url, fetch='http', items=None, fields=None, container=None, json_paths=None,
+                 limit=3, anchor=None, window=None, base_url=None, skip_titles=(), ttl=60, deadline=10,
+                 request_timeout=None, max_timeout=None, handler=None, label=None, section=None, top_story=False):
+        self.name = name
+        self.url = url
+        # שם התצוגה, המדור שהמקור מוצג בו (לפי סדר ההופעה ב-SOURCES), והאם הוא נכנס לסיפורים המובילים
+        self.label = label or name
+        self.section = section
+        self.top_story = top_story
+        # http (GET מותנה ופענוח HTML), cloudscraper (אתרים מאחורי Cloudflare), json, או custom עם handler
+        self.fetch = fetch
+        # סלקטורים חלופיים לפריטים: הראשון שמוצא משהו קובע
+        self.items = [compile_selector(css) for css in ((items,) if isinstance(items, str) else items or ())]
+        # שדה שערכו None מוגדר במקור אבל אינו קיים בעמוד, ומקבל את ערך ברירת המחדל
+        self.fields = fields or {}
+        self.container = compile_selector(container) if container else None
+        self.json_paths = json_paths or ((),)
+        self.limit = limit
+        self.anchor = anchor
+        self.window = window
+        self.base_url = base_url or url
+        self.skip_titles = frozenset(skip_titles)
+        self.ttl = ttl
+        self.deadline = deadline
+        self.request_timeout = request_timeout
+        self.max_timeout = max_timeout
+        self.handler = handler
+
+    def _item_nodes(self, p, root):
+        if self.container is not None:
+            root = p.select_one(root, self.container)
+            if root is None:
+                return []
+        for selector in self.items:
+            found = p.select(root, selector)
+            if found:
+                return found
+        return []
+
+    def normalize(self, raw):
+        """רשומת כותרת אחידה: title ו-link תמיד, time רק במקורות שמגדירים שעה"""
+        title = raw.get('title') or NO_TITLE
+        if title in self.skip_titles:
+            return None
+        link = raw.get('link')
+        if link and link != '#' and not link.startswith('http'):
+            link = urljoin(self.base_url, link)
+        record = {'title': title, 'link': link or '#'}
+        if 'time' in self.fields:
+            record['time'] = raw.get('time') or NO_TIME
+        return record
+
+    def _collect(self, raw_items):
+        results = []
+        for raw in raw_items:
+            record = self.normalize(raw)
+            if record is not None:
+                results.append(record)
+                if len(results) >= self.limit:
+                    break
+        return results
+
+    def extract(self, p, root):
+        nodes = self._item_nodes(p, root)
+        return self._collect({name: field.extract(p, node) for name, field in self.fields.items() if field} for node in nodes)
+
+    def parse_page(self, html):
+        """(כותרות, partial) - ראו html_parsing.parse_page"""
+        return html_parsing.parse_page(self.name, html, self.extract, anchor=self.anchor, window=self.window)
+
+    def parse_html(self, html):
+        return self.parse_page(html)[0]
+
+    def region(self, html):
+        """החלק של העמוד שקובע את הכותרות כשהפענוח חלקי; לפיו http_client מזהה עמוד שלא השתנה"""
+        return html_parsing.partial_region(html, self.anchor, self.window)
+
+    def parse_json(self, data):
+        for path in self.json_paths:
+            items = _resolve(data, path)
+            if isinstance(items, list) and items:
+                return self._collect({name: field.extract(item) for name, field in self.fields.items() if field} for item in items if isinstance(item, dict))
+        return []
+
+    async def parse_html_async(self, html):
+        # הפענוח רץ במאגר התהליכים, מחוץ ל-GIL של הבוט; מחזיר (כותרות, partial)
+        return await parse_pool.parse(self.name, html)
+
+    def _fetch_cloudscraper(self):
+        # cloudscraper חוסם, ולכן השאיבה רצה בתהליכון; הסשנים והעוגיות נשארים בתהליך הבוט
+        response = session_pool.get(self.url, headers=http_client.BASE_HEADERS, timeout=self.request_timeout or 10)
+        return response.text
+
+    async def _run(self):
+        if self.fetch == 'custom':
+            return await self.handler()
+        if self.fetch == 'json':
+            return self.parse_json(await http_client.fetch_json(self.url, headers=http_client.BASE_HEADERS, timeout=self.request_timeout))
+        if self.fetch == 'cloudscraper':
+            results, _ = await self.parse_html_async(await asyncio.to_thread(self._fetch_cloudscraper))
+            return results
+        return await http_client.fetch_parsed(self.url, self.parse_html_async, headers=http_client.BASE_HEADERS,
+                                              timeout=self.request_timeout, region=self.region)
+
+    async def run(self):
+        """שאיבה, פענוח ונרמול; תמיד מחזיר (כותרות, שגיאה)"""
+        try:
+            result = await self._run()
+        except Exception as e:
+            logger.error(f"שגיאה בסקריפינג {self.name}: {e}")
+            return [], f"שגיאה לא ידועה: {str(e)}"
+        results, error = result if isinstance(result, tuple) else (result, None)
+        if not results and not error:
+            error = "לא נמצאו מבזקים בעמוד"
+        logger.debug(f"סקריפינג {self.name}: {len(results)} כותרות")
+        return results, error
+
+def register_sources(cache, sources):
+    for source in sources:
+        kwargs = {'max_timeout': source.max_timeout} if source.max_timeout else {}
+        cache.register(source.name, source.run, source.ttl, **kwargs)
@@ -0,0 +1,158 @@
+import logging
+from datetime import datetime
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.helpers import escape_markdown
+
+from circuit_breaker import UNAVAILABLE_MESSAGE
+from sources import SOURCES
+
+logger = logging.getLogger(__name__)
+
+LOADING_MARKER = "⏳ עדיין בטעינה, נסו שוב בעוד רגע"
+
+MAIN_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔥 הסיפורים המובילים", callback_data='top_stories')],
+    [InlineKeyboardButton("⚽🏀 חדשות ספורט", callback_data='sports_news')],
+    [InlineKeyboardButton("💻 חדשות טכנולוגיה", callback_data='tech_news')],
+    [InlineKeyboardButton("📺 חדשות מערוצי טלוויזיה", callback_data='tv_news')]
+])
+BACK_KEYBOARD = InlineKeyboardMarkup([[InlineKeyboardButton("🏠 חזרה לעמוד ראשי", callback_data='latest_news')]])
+
+def _link_text(text):
+    # בטקסט של קישור ב-Markdown רק ']' שובר את הישות
+    return str(text).replace('[', '(').replace(']', ')')
+
+def _url(link):
+    return str(link).replace(')', '%29').replace(' ', '%20')
+
+def _plain(text):
+    return escape_markdown(str(text), version=1)
+
+def headline_line(idx, article, with_time=True):
+    if with_time and 'time' in article:
+        label = f"{article['time']} - {article['title']}"
+    else:
+        label = article['title']
+    if article.get('link'):
+        return f"{idx}. [{_link_text(label)}]({_url(article['link'])})"
+    return f"{idx}. {_plain(label)}"
+
+def error_line(error):
+    if error == LOADING_MARKER:
+        return LOADING_MARKER
+    return f"לא ניתן למצוא מבזקים\n**פרטי השגיאה:** {_plain(error)}"
+
+def _source_lines(articles, error, with_time=True):
+    if articles:
+        lines = [headline_line(idx, article, with_time) for idx, article in enumerate(articles[:3], 1)]
+        if error == UNAVAILABLE_MESSAGE:
+            # מעגל פתוח: הכותרות הן האחרונות שנשאבו, והמקור לא מתעדכן כרגע
+            lines.append(f"⚠️ {UNAVAILABLE_MESSAGE}")
+        return lines
+    return [error_line(error)]
+
+def render_latest(sources):
+    lines = ["📰 **המבזקים האחרונים** 📰", ""]
+    for site, articles, error in sources:
+        lines.append(f"**{site}:**")
+        if articles:
+            lines.extend(_source_lines(articles, error))
+        elif error == LOADING_MARKER:
+            lines.append(LOADING_MARKER)
+        else:
+            lines.append("לא ניתן לטעון כרגע")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+def render_sports(sources):
+    lines = []
+    for site, articles, error in sources:
+        if lines:
+            lines.append("")
+        lines.append(f"**{site}**")
+        lines.extend(_source_lines(articles, error, with_time=False))
+    return "\n".join(lines) + "\n"
+
+def render_tech(sources):
+    lines = ["**חדשות טכנולוגיה**", ""]
+    for site, articles, error in sources:
+        if len(lines) > 2:
+            lines.append("")
+        lines.append(f"**{site}**")
+        lines.extend(_source_lines(articles, error))
+    return "\n".join(lines) + "\n"
+
+def render_tv(sources):
+    lines = ["**חדשות מערוצי טלוויזיה**", ""]
+    for site, articles, error in sources:
+        if len(lines) > 2:
+            lines.append("")
+        lines.append(f"**{site}**:")
+        lines.extend(_source_lines(articles, error))
+    return "\n".join(lines) + "\n"
+
+SOURCE_NAMES = {source.name: source.label for source in SOURCES}
+
+def render_top_stories(stories):
+    lines = ["🔥 **הסיפורים המובילים** 🔥", ""]
+    if not stories:
+        lines.append("אין עדיין מספיק מבזקים, נסו שוב בעוד רגע")
+    for idx, story in enumerate(stories, 1):
+        names = ", ".join(SOURCE_NAMES.get(source, source) for source in sorted(story.sources))
+        lines.append(headline_line(idx, story.lead))
+        lines.append(f"   📡 {len(story.sources)} מקורות: {_plain(names)}")
+    return "\n".join(lines) + "\n"
+
+# מגבלת האורך של הודעת טלגרם היא 4096 תווים
+MAX_MESSAGE_LENGTH = 4000
+
+def render_history(title, hours, headlines):
+    lines = [f"🕘 **{title} - {hours:g} השעות האחרונות**", ""]
+    if not headlines:
+        lines.append("לא נמצאו כותרות בטווח הזה")
+    length = sum(len(line) + 1 for line in lines)
+    for idx, headline in enumerate(headlines, 1):
+        seen = datetime.fromtimestamp(headline['first_seen']).strftime("%H:%M")
+        source = SOURCE_NAMES.get(headline['source'], headline['source'])
+        line = headline_line(idx, {'time': seen, 'title': headline['title'], 'link': headline['link']}) + f" ({_plain(source)})"
+        length += len(line) + 1
+        if length > MAX_MESSAGE_LENGTH:
+            break
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+class SectionRenderer:
+    """הודעה ומקלדת מוכנות מראש למדור; מרונדרות מחדש רק כשהכותרות של המקורות משתנות"""
+
+    def __init__(self, name, render, keyboard):
+        self.name = name
+        # המקורות של המדור ושמות התצוגה שלהם, לפי סדר ההופעה ב-SOURCES
+        self.sources = tuple(source.name for source in SOURCES if source.section == name)
+        self.labels = tuple(source.label for source in SOURCES if source.section == name)
+        self.render = render
+        self.keyboard = keyboard
+        self._key = None
+        self._text = None
+
+    def _unchanged(self, key):
+        if self._key is None or len(key) != len(self._key):
+            return False
+        return all((results is old_results or results == old_results) and error == old_error
+                   for (results, error), (old_results, old_error) in zip(key, self._key))
+
+    def payload(self, fetched):
+        """fetched: רשימת (כותרות, שגיאה) לפי סדר המקורות; מחזיר (טקסט, מקלדת)"""
+        key = [tuple(item) for item in fetched]
+        if not self._unchanged(key):
+            self._text = self.render([(label, results, error) for label, (results, error) in zip(self.labels, key)])
+            self._key = key
+            logger.debug(f"Rendered section {self.name} ({len(self._text)} chars)")
+        return self._text, self.keyboard
+
+SECTIONS = {
+    'latest': SectionRenderer('latest', render_latest, MAIN_KEYBOARD),
+    'sports': SectionRenderer('sports', render_sports, BACK_KEYBOARD),
+    'tech': SectionRenderer('tech', render_tech, BACK_KEYBOARD),
+    'tv': SectionRenderer('tv', render_tv, BACK_KEYBOARD)
+}
@@ -0,0 +1,107 @@
+from pipeline import Source, Field, JsonField
+from tv_scraper import run_apify_actor
+
+def _walla_title(title):
+    # בוואלה השעה צמודה לכותרת ("12:30כותרת")
+    if len(title) > 5 and title[2] == ':':
+        return title[:5] + ": " + title[5:]
+    return title
+
+def _reshet13_time(value):
+    return value.replace('-', '/')[2:10] + ' ' + value[11:16]
+
+def _arutz7_time(value):
+    return value[:16].replace('T', ' ')
+
+# כל המקורות של הבוט; הוספת מקור היא הוספת רשומה כאן, והסדר כאן הוא סדר ההצגה בתוך כל מדור
+SOURCES = [
+    Source(
+        'ynet', 'https://www.ynet.co.il/news',
+        items='div.slotTitle',
+        fields={'title': Field(raw=True), 'link': Field('a', attr='href')},
+        limit=5, anchor='slotTitle', window=20000, ttl=60, deadline=6,
+        label='Ynet', section='latest', top_story=True
+    ),
+    Source(
+        'arutz7', 'https://www.inn.co.il/api/NewAPI/Cat?type=10', fetch='json',
+        json_paths=(('Items',), ()),
+        fields={
+            'time': JsonField('time', 'itemDate', transform=_arutz7_time),
+            'title': JsonField('title'),
+            'link': JsonField('shotedLink', 'link')
+        },
+        base_url='https://www.inn.co.il', ttl=60, deadline=6,
+        label='ערוץ 7', section='latest', top_story=True
+    ),
+    Source(
+        'walla', 'https://news.walla.co.il/',
+        container='div.top-section-newsflash.no-mobile', items='a',
+        fields={'title': Field(transform=_walla_title), 'link': Field(attr='href')},
+        skip_titles=("מבזקי חדשות", "מבזקים"),
+        anchor='top-section-newsflash', window=20000, ttl=60, deadline=6,
+        label='Walla', section='latest', top_story=True
+    ),
+    Source(
+        'sport5', 'https://m.sport5.co.il/', fetch='cloudscraper',
+        items='nav.posts-list.posts-list-articles ul li',
+        fields={'title': Field('h2.post-title'), 'link': Field('a.item', attr='href'), 'time': Field('em.time')},
+        anchor='posts-list-articles', ttl=120, deadline=10,
+        label='ספורט 5', section='sports'
+    ),
+    Source(
+        'sport1', 'https://sport1.maariv.co.il/', fetch='cloudscraper',
+        items='div.hot-news-container article.article-card',
+        fields={
+            'title': Field('h3.article-card-title'),
+            'link': Field(closest=('a', 'image-wrapper'), attr='href'),
+            'time': Field('time.entry-date')
+        },
+        anchor='hot-news-container', ttl=120, deadline=10,
+        label='ספורט 1', section='sports'
+    ),
+    Source(
+        'one', 'https://m.one.co.il/mobile/', fetch='cloudscraper',
+        items='a.mobile-hp-article-plain',
+        # לא נמצא תג זמן בעמוד, ולכן השעה נשארת ברירת המחדל
+        fields={'title': Field('h1'), 'link': Field(attr='href'), 'time': None},
+        anchor='mobile-hp-article-plain', ttl=120, deadline=10,
+        label='ONE', section='sports'
+    ),
+    Source(
+        'ynet_tech', 'https://www.ynet.co.il/digital/technews',
+        items='div.slotView',
+        fields={'title': Field('div.slotTitle a'), 'link': Field('div.slotTitle a', attr='href'), 'time': Field('span.dateView')},
+        anchor='slotView', window=40000, request_timeout=5, ttl=300, deadline=6,
+        label='Ynet Tech', section='tech'
+    ),
+    Source(
+        'calcalist_tech', 'https://www.calcalist.co.il/calcalistech/category/3778',
+        # מבנה העמוד לא יציב: קודם כרטיסי teaser, ואם אין - קישורים ישירים לכתבות
+        items=('div.teaser', 'a[href*="/calcalistech/article"]'),
+        fields={'title': Field('a', self_tag='a'), 'link': Field('a', attr='href', self_tag='a')},
+        request_timeout=5, ttl=300, deadline=6,
+        label='כלכליסט טק', section='tech'
+    ),
+    # ערוץ 14 מגיע דרך ריצות של Actor ב-Apify, עם RSS בתוך ה-Dataset
+    Source(
+        'channel14', 'https://www.now14.co.il/feed/', fetch='custom', handler=run_apify_actor,
+        ttl=300, deadline=15, max_timeout=90,
+        label='עכשיו 14', section='tv', top_story=True
+    ),
+    Source(
+        'keshet12', 'https://www.mako.co.il/news-dailynews',
+        items='ul.grid-ordering.mainItem6 > li',
+        fields={'title': Field('p strong a'), 'link': Field('p strong a', attr='href'), 'time': Field('small span', index=1)},
+        anchor='mainItem6', window=30000, request_timeout=15, ttl=120, deadline=10,
+        label='קשת 12', section='tv', top_story=True
+    ),
+    Source(
+        'reshet13', 'https://13tv.co.il/_next/data/ObWGmDraUyjZLnpGtZra0/he/news/news-flash.json?all=news&all=news-flash', fetch='json',
+        json_paths=(('pageProps', 'page', 'Content', 'PageGrid', 0, 'newsFlashArr'), ('pageProps', 'newsFlashArr')),
+        fields={'title': JsonField('text'), 'link': JsonField('link'), 'time': JsonField('time', transform=_reshet13_time)},
+        base_url='https://13tv.co.il', request_timeout=15, ttl=120, deadline=10,
+        label='רשת 13', section='tv', top_story=True
+    )
+]
+
+SOURCES_BY_NAME = {source.name: source for source in SOURCES}
@@ -1,6 +1,9 @@
-import cloudscraper
-from bs4 import BeautifulSoup
 import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+import metrics
 
 # הגדרת לוגים ברמת DEBUG
 logging.basicConfig(
@@ -10,112 +13,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-BASE_HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    'Accept-Language': 'en-US,en;q=0.9,he;q=0.8',
-    'Referer': 'https://www.google.com/',
-    'Connection': 'keep-alive',
-    'Upgrade-Insecure-Requests': '1'
-}
+# כמה זמן משתמשים באותו סשן לכל היותר, גם אם עוגיית ה-clearance לא מציינת תפוגה
+SESSION_MAX_AGE = int(os.getenv("CLOUDSCRAPER_SESSION_MAX_AGE", "1800"))
+# כמה זמן לפני התפוגה מחליפים את הסשן ברקע
+SESSION_REFRESH_MARGIN = int(os.getenv("CLOUDSCRAPER_REFRESH_MARGIN", "120"))
+SESSION_CHECK_INTERVAL = 30
 
-def scrape_sport5():
-    try:
-        url = 'https://m.sport5.co.il/'
-        scraper = cloudscraper.create_scraper()
-        response = scraper.get(url, headers=BASE_HEADERS, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        articles = soup.select('nav.posts-list.posts-list-articles ul li')
-        
-        results = []
-        for item in articles[:3]:
-            link_tag = item.find('a', class_='item')
-            title_tag = item.find('h2', class_='post-title')
-            time_tag = item.find('em', class_='time')
-            
-            title = title_tag.get_text(strip=True) if title_tag else 'ללא כותרת'
-            link = link_tag['href'] if link_tag else '#'
-            time = time_tag.get_text(strip=True) if time_tag else 'ללא שעה'
-            
-            if link and not link.startswith('http'):
-                link = f"https://m.sport5.co.il{link}"
-            
-            results.append({
-                'time': time,
-                'title': title,
-                'link': link
-            })
-        
-        logger.debug(f"סקריפינג ספורט 5 הצליח: {len(results)} כתבות נשלפו")
-        return results, None
-    except Exception as e:
-        logger.error(f"שגיאה בסקריפינג ספורט 5: {e}")
-        return [], f"שגיאה לא ידועה: {str(e)}"
+class _DomainSlot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scraper = None
+        self.created_at = 0.0
 
-def scrape_sport1():
-    try:
-        url = 'https://sport1.maariv.co.il/'
-        scraper = cloudscraper.create_scraper()
-        response = scraper.get(url, headers=BASE_HEADERS, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        articles = soup.select('div.hot-news-container article.article-card')
-        
-        results = []
-        for item in articles[:3]:
-            link_tag = item.find_parent('a', class_='image-wrapper')
-            title_tag = item.find('h3', class_='article-card-title')
-            time_tag = item.find('time', class_='entry-date')
-            
-            title = title_tag.get_text(strip=True) if title_tag else 'ללא כותרת'
-            link = link_tag['href'] if link_tag else '#'
-            time = time_tag.get_text(strip=True) if time_tag else 'ללא שעה'
-            
-            if link and not link.startswith('http'):
-                link = f"https://sport1.maariv.co.il{link}"
-            
-            results.append({
-                'time': time,
-                'title': title,
-                'link': link
-            })
-        
-        logger.debug(f"סקריפינג ספורט 1 הצליח: {len(results)} כתבות נשלפו")
-        return results, None
-    except Exception as e:
-        logger.error(f"שגיאה בסקריפינג ספורט 1: {e}")
-        return [], f"שגיאה לא ידועה: {str(e)}"
+class ScraperSessionPool:
+    """סשן cloudscraper אחד לכל דומיין, שנשמר בין קריאות כדי לשמור את עוגיות ה-Cloudflare ואת החיבורים"""
+
+    def __init__(self, max_age=SESSION_MAX_AGE, refresh_margin=SESSION_REFRESH_MARGIN):
+        self.max_age = max_age
+        self.refresh_margin = refresh_margin
+        self._slots = {}
+        self._slots_lock = threading.Lock()
+        self._refresher = None
+
+    def _slot(self, domain):
+        with self._slots_lock:
+            slot = self._slots.get(domain)
+            if slot is None:
+                slot = self._slots[domain] = _DomainSlot()
+            return slot
+
+    def _expires_at(self, slot):
+        deadline = slot.created_at + self.max_age
+        for cookie in slot.scraper.cookies:
+            if cookie.name == 'cf_clearance' and cookie.expires:
+                deadline = min(deadline, cookie.expires)
+        return deadline
 
-def scrape_one():
-    try:
-        url = 'https://m.one.co.il/mobile/'
+    def _create(self, domain, warm_up=False):
+        # cloudscraper (ואיתו requests) נטען רק בשימוש הראשון, מחוץ לנתיב העלייה של הבוט
+        import cloudscraper
         scraper = cloudscraper.create_scraper()
-        response = scraper.get(url, headers=BASE_HEADERS, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        articles = soup.select('a.mobile-hp-article-plain')
-        
-        results = []
-        for item in articles[:3]:
-            link_tag = item
-            title_tag = item.find('h1')
-            time = 'ללא שעה'  # הערה: לא נמצא תג זמן, נשאר כברירת מחדל
-            
-            title = title_tag.get_text(strip=True) if title_tag else 'ללא כותרת'
-            link = link_tag['href'] if link_tag else '#'
-            
-            if link and not link.startswith('http'):
-                link = f"https://m.one.co.il{link}"
-            
-            results.append({
-                'time': time,
-                'title': title,
-                'link': link
-            })
-        
-        logger.debug(f"סקריפינג ONE הצליח: {len(results)} כתבות נשלפו")
-        return results, None
-    except Exception as e:
-        logger.error(f"שגיאה בסקריפינג ONE: {e}")
-        return [], f"שגיאה לא ידועה: {str(e)}"
+        if warm_up:
+            # פותר את אתגר ה-Cloudflare מראש, כך שהבקשה הבאה של משתמש לא תשלם עליו
+            scraper.get(f"https://{domain}/", timeout=10)
+        logger.debug(f"נוצר סשן cloudscraper חדש עבור {domain}")
+        return scraper
+
+    def get(self, url, **kwargs):
+        domain = urlparse(url).netloc
+        slot = self._slot(domain)
+        self._ensure_refresher()
+        # requests.Session אינו בטוח לשימוש מקבילי, ולכן כל דומיין מוגן במנעול משלו
+        with slot.lock:
+            if slot.scraper is None or time.time() >= self._expires_at(slot):
+                if slot.scraper is not None:
+                    slot.scraper.close()
+                slot.scraper = self._create(domain)
+                slot.created_at = time.time()
+            started = time.perf_counter()
+            try:
+                return slot.scraper.get(url, **kwargs)
+            finally:
+                metrics.observe_fetch(time.perf_counter() - started)
+
+    def refresh_expiring(self):
+        with self._slots_lock:
+            slots = list(self._slots.items())
+        for domain, slot in slots:
+            # העוגיות נקראות תחת מנעול הדומיין, כי בקשה שרצה באותו סשן עשויה לכתוב ל-cookie jar באותו זמן
+            with slot.lock:
+                due = slot.scraper is not None and time.time() >= self._expires_at(slot) - self.refresh_margin
+            if not due:
+                continue
+            try:
+                fresh = self._create(domain, warm_up=True)
+            except Exception as e:
+                logger.warning(f"רענון מוקדם של סשן {domain} נכשל: {e}")
+                continue
+            with slot.lock:
+                old, slot.scraper, slot.created_at = slot.scraper, fresh, time.time()
+            old.close()
+            logger.debug(f"סשן {domain} רוענן ברקע")
+
+    def _run_refresher(self):
+        while True:
+            time.sleep(SESSION_CHECK_INTERVAL)
+            try:
+                self.refresh_expiring()
+            except Exception as e:
+                logger.error(f"שגיאה ברענון סשנים של cloudscraper: {e}")
+
+    def _ensure_refresher(self):
+        if self._refresher is None:
+            with self._slots_lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(target=self._run_refresher, name="cloudscraper-refresher", daemon=True)
+                    self._refresher.start()
+
+session_pool = ScraperSessionPool()
@@ -0,0 +1,45 @@
+import logging
+import os
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# תקציב הזמן מתחילת התהליך ועד שהבוט מקבל עדכונים; חריגה נרשמת כאזהרה
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET_SECONDS", "3"))
+
+def _process_started():
+    """רגע תחילת התהליך בשעון monotonic, כולל עליית המפרש; בלי /proc - רגע ייבוא המודול"""
+    try:
+        with open('/proc/self/stat') as f:
+            # השדה ה-22 (starttime) בטיקים מאז עליית המערכת; שם התהליך שבסוגריים עלול להכיל רווחים
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.monotonic() - (uptime - ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return time.monotonic()
+
+_started = _process_started()
+_phases = []
+
+def mark(phase):
+    """רושם את הזמן שעבר מתחילת התהליך עד סוף השלב"""
+    _phases.append((phase, time.monotonic() - _started))
+
+def report():
+    """מסכם את שלבי העלייה בשורת לוג אחת ובמדד startup_seconds"""
+    mark("ready")
+    previous = 0.0
+    parts = []
+    for phase, elapsed in _phases:
+        metrics.startup_seconds.set(round(elapsed, 3), phase)
+        parts.append(f"{phase} +{elapsed - previous:.2f}s")
+        previous = elapsed
+    total = _phases[-1][1]
+    message = f"Startup took {total:.2f}s ({', '.join(parts)})"
+    if total > STARTUP_BUDGET:
+        logger.warning(f"{message} - over the {STARTUP_BUDGET:.1f}s budget; run with python -X importtime to find slow imports")
+    else:
+        logger.info(message)
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+
+from telegram.error import Forbidden, RetryAfter, TelegramError
+
+from rendering import headline_line
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTIONS_DB_FILE = os.getenv("SUBSCRIPTIONS_DB_FILE", "subscriptions.db")
+# כל כמה שניות בודקים אם יש כותרות חדשות לשלוח
+PUSH_INTERVAL = int(os.getenv("PUSH_INTERVAL", "60"))
+# מגבלות השליחה של טלגרם: כ-30 הודעות בשנייה בסך הכל, והודעה אחת בשנייה לכל צ'אט
+GLOBAL_RATE = float(os.getenv("BROADCAST_GLOBAL_RATE", "25"))
+PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1.1"))
+BROADCAST_WORKERS = 4
+SENT_RETENTION = 3 * 24 * 3600
+MAX_ITEMS_PER_PUSH = 10
+
+SECTION_TITLES = {
+    'latest': "📰 מבזקים חדשים",
+    'sports': "⚽🏀 חדשות ספורט",
+    'tech': "💻 חדשות טכנולוגיה",
+    'tv': "📺 חדשות מערוצי טלוויזיה"
+}
+
+class SubscriptionStore:
+    """מנויים ורשימת הכותרות שכבר נשלחו, בקובץ SQLite"""
+
+    def __init__(self, path=SUBSCRIPTIONS_DB_FILE):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS subscriptions (chat_id INTEGER, section TEXT, PRIMARY KEY (chat_id, section))")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_section ON subscriptions (section)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sent_headlines (section TEXT, key TEXT, sent_at REAL, PRIMARY KEY (section, key))")
+        self.conn.commit()
+
+    def subscribe(self, chat_id, section):
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO subscriptions (chat_id, section) VALUES (?, ?)", (chat_id, section))
+
+    def unsubscribe(self, chat_id, section=None):
+        with self.conn:
+            if section is None:
+                return self.conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,)).rowcount
+            return self.conn.execute("DELETE FROM subscriptions WHERE chat_id = ? AND section = ?", (chat_id, section)).rowcount
+
+    def subscribers(self, section):
+        return [row[0] for row in self.conn.execute("SELECT chat_id FROM subscriptions WHERE section = ?", (section,))]
+
+    def active_sections(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT section FROM subscriptions")]
+
+    def sent_keys(self, section):
+        return {row[0] for row in self.conn.execute("SELECT key FROM sent_headlines WHERE section = ?", (section,))}
+
+    def mark_sent(self, section, keys):
+        """מסמן כותרות כנשלחות ומעדכן את זמנן; רשומות שלא עודכנו SENT_RETENTION נמחקות"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO sent_headlines (section, key, sent_at) VALUES (?, ?, ?)", [(section, key, now) for key in keys])
+            self.conn.execute("DELETE FROM sent_headlines WHERE sent_at < ?", (now - SENT_RETENTION,))
+
+class BroadcastQueue:
+    """תור שליחה ברקע שמכבד את מגבלת הקצב הכללית והמגבלה לכל צ'אט, ומטפל ב-RetryAfter"""
+
+    def __init__(self, bot, on_blocked=None, rate=GLOBAL_RATE, per_chat_interval=PER_CHAT_INTERVAL):
+        self.bot = bot
+        self.on_blocked = on_blocked
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self._queue = None
+        self._next_global = 0.0
+        # עד מתי טלגרם ביקשה להפסיק לשלוח (RetryAfter); חל גם על מקומות שכבר נשמרו
+        self._paused_until = 0.0
+        self._next_per_chat = {}
+        self._workers = []
+
+    def put(self, chat_id, text, **kwargs):
+        self._queue.put_nowait((chat_id, text, kwargs))
+
+    def _reserve_slot(self, chat_id):
+        """שומר מקום בלוח הזמנים (הכללי ושל הצ'אט) ומחזיר כמה שניות לחכות עד אליו"""
+        now = time.monotonic()
+        send_at = max(now, self._next_global, self._paused_until, self._next_per_chat.get(chat_id, 0.0))
+        self._next_global = max(self._next_global, now, self._paused_until) + 1.0 / self.rate
+        self._next_per_chat[chat_id] = send_at + self.per_chat_interval
+        if len(self._next_per_chat) > 10000:
+            self._next_per_chat = {chat: t for chat, t in self._next_per_chat.items() if t > now}
+        return send_at - now
+
+    async def _wait_for_slot(self, chat_id):
+        """ממתין למקום שנשמר; RetryAfter שהתקבל בזמן ההמתנה מבטל אותו, ונשמר מקום חדש אחרי ההשהיה"""
+        while True:
+            delay = self._reserve_slot(chat_id)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if time.monotonic() >= self._paused_until:
+                return
+
+    async def _send(self, chat_id, text, kwargs):
+        while True:
+            await self._wait_for_slot(chat_id)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                return
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                logger.warning(f"RetryAfter של {retry_after} שניות בשליחה ל-{chat_id}")
+                # מגבלת קצב של טלגרם חלה על כל הבוט - כל העובדים ממתינים, וההודעה נשלחת שוב במקומה ולא בסוף התור
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            except Forbidden:
+                logger.info(f"Chat {chat_id} blocked the bot, removing its subscriptions")
+                if self.on_blocked:
+                    self.on_blocked(chat_id)
+                return
+            except TelegramError as e:
+                logger.error(f"שגיאה בשליחת עדכון ל-{chat_id}: {e}")
+                return
+
+    async def _worker(self):
+        while True:
+            chat_id, text, kwargs = await self._queue.get()
+            try:
+                await self._send(chat_id, text, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def start(self, workers=BROADCAST_WORKERS):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._workers:
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+class SubscriptionManager:
+    """משווה את הכותרות העדכניות לאלה שכבר נשלחו, ושולח למנויים רק את החדשות"""
+
+    def __init__(self, bot, sections, fetch, store=None):
+        self.sections = sections
+        self.fetch = fetch
+        self.store = store or SubscriptionStore()
+        self.queue = BroadcastQueue(bot, on_blocked=self.store.unsubscribe)
+        self._task = None
+
+    @staticmethod
+    def _key(article):
+        link = article.get('link')
+        return link if link and link != '#' else article.get('title')
+
+    def render_update(self, section, articles):
+        lines = [f"**{SECTION_TITLES[section]}**"]
+        # כמו בתצוגת הספורט, שעות הכותרות לא מוצגות במדור הזה
+        with_time = section != 'sports'
+        lines.extend(headline_line(idx, article, with_time) for idx, article in enumerate(articles, 1))
+        return "\n".join(lines)
+
+    async def push_section(self, section):
+        renderer = self.sections[section]
+        fetched = await self.fetch(*renderer.sources)
+        articles = [article for results, _ in fetched for article in results[:3]]
+        current = {self._key(article): article for article in articles if self._key(article)}
+        if not current:
+            return 0
+        sent = self.store.sent_keys(section)
+        new_keys = [key for key in current if key not in sent]
+        # כל הכותרות שעדיין ברשימה מתחדשות, כך שכותרת שנשארת בעמוד יותר מ-SENT_RETENTION לא נמחקת ונשלחת שוב
+        self.store.mark_sent(section, list(current))
+        if not new_keys:
+            return 0
+        if not sent:
+            # הפעם הראשונה שהמדור נבדק: רק מסמנים את הקיים, כדי לא להציף את המנויים
+            return 0
+        text = self.render_update(section, [current[key] for key in new_keys[:MAX_ITEMS_PER_PUSH]])
+        subscribers = self.store.subscribers(section)
+        for chat_id in subscribers:
+            self.queue.put(chat_id, text, parse_mode='Markdown', disable_web_page_preview=True)
+        logger.info(f"{len(new_keys)} כותרות חדשות במדור {section} נשלחות ל-{len(subscribers)} מנויים")
+        return len(new_keys)
+
+    async def _run(self):
+        while True:
+            for section in self.store.active_sections():
+                if section not in self.sections:
+                    continue
+                try:
+                    await self.push_section(section)
+                except Exception as e:
+                    logger.error(f"שגיאה בבדיקת עדכונים למדור {section}: {e}")
+            await asyncio.sleep(PUSH_INTERVAL)
+
+    def start(self):
+        self.queue.start()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.queue.stop()
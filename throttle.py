@@ -0,0 +1,63 @@
+import functools
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# לחיצה חוזרת של אותו משתמש על אותו כפתור בתוך פרק הזמן הזה לא מטופלת שוב
+THROTTLE_SECONDS = float(os.getenv("USER_THROTTLE_SECONDS", "3"))
+THROTTLE_MAX_TRACKED = int(os.getenv("USER_THROTTLE_MAX_TRACKED", "10000"))
+THROTTLED_MESSAGE = "⏳ רגע, הבקשה שלך כבר התקבלה"
+
+class UserThrottle:
+    """מגביל לחיצות חוזרות לכל (משתמש, פעולה): לא יותר מאחת בכל interval, ולא בזמן שהקודמת עדיין רצה"""
+
+    def __init__(self, interval=THROTTLE_SECONDS, max_tracked=THROTTLE_MAX_TRACKED):
+        self.interval = interval
+        self.max_tracked = max_tracked
+        self._last = OrderedDict()
+        self._running = set()
+
+    def acquire(self, user_id, action):
+        key = (user_id, action)
+        now = time.monotonic()
+        if key in self._running or now - self._last.get(key, float("-inf")) < self.interval:
+            return False
+        self._last[key] = now
+        self._last.move_to_end(key)
+        if len(self._last) > self.max_tracked:
+            self._last.popitem(last=False)
+        self._running.add(key)
+        return True
+
+    def release(self, user_id, action):
+        self._running.discard((user_id, action))
+
+user_throttle = UserThrottle()
+
+def throttled(action):
+    """דקורטור ל-handler: לחיצה או פקודה חוזרת נענית בהודעה קצרה, בלי שאיבה ובלי רישום בלוג השימוש"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update, context):
+            user = update.effective_user
+            if user is None or user_throttle.interval <= 0:
+                return await func(update, context)
+            if not user_throttle.acquire(user.id, action):
+                metrics.throttled_total.inc(action)
+                logger.debug(f"Throttled {action} from user {user.id}")
+                if update.callback_query is not None:
+                    await update.callback_query.answer(THROTTLED_MESSAGE)
+                elif update.message is not None:
+                    await update.message.reply_text(THROTTLED_MESSAGE)
+                return
+            try:
+                return await func(update, context)
+            finally:
+                user_throttle.release(user.id, action)
+        return wrapper
+    return decorator
@@ -1,10 +1,10 @@
 import os
-import time
-import requests
-import json
-from bs4 import BeautifulSoup
+import random
+import html
+from lxml import etree
 import logging
 import asyncio
+import http_client
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -17,126 +17,124 @@ APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN")
 APIFY_ACTOR_ID = "XjjDkeadhnlDBTU6i"
 APIFY_API_URL = "https://api.apify.com/v2"
 
-TV_SITES = {
-    'keshet12': 'https://www.mako.co.il/news-dailynews',
-    'reshet13': 'https://13tv.co.il/_next/data/ObWGmDraUyjZLnpGtZra0/he/news/news-flash.json?all=news&all=news-flash',
-    'channel14': 'https://www.now14.co.il/feed/'
+MONTHS_HEBREW = {
+    'Jan': 'ינואר', 'Feb': 'פברואר', 'Mar': 'מרץ', 'Apr': 'אפריל',
+    'May': 'מאי', 'Jun': 'יוני', 'Jul': 'יולי', 'Aug': 'אוגוסט',
+    'Sep': 'ספטמבר', 'Oct': 'אוקטובר', 'Nov': 'נובמבר', 'Dec': 'דצמבר'
 }
 
-BASE_HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    'Accept-Language': 'en-US,en;q=0.9,he;q=0.8',
-    'Referer': 'https://www.google.com/',
-    'Connection': 'keep-alive',
-    'Upgrade-Insecure-Requests': '1'
-}
+# תוצאות ערוץ 14 לפי defaultDatasetId: כל Dataset נשאב ומפוענח פעם אחת בלבד לכל ריצה של ה-Actor
+_channel14_by_dataset = {}
+
+RSS_CHUNK_SIZE = 16384
+DC_DATE_TAG = '{http://purl.org/dc/elements/1.1/}date'
+# כמה תווים מתוכן הפריט הראשון נכנסים ללוג הדיבאג
+DEBUG_CONTENT_CHARS = 300
+
+def _rss_chunks(content, size=RSS_CHUNK_SIZE):
+    """מחזיר את ה-RSS שבתוך <pre> במקטעים, ומפענח HTML entities מקטע אחר מקטע"""
+    start = content.find('<pre')
+    if start == -1:
+        start, end, escaped = 0, len(content), False
+    else:
+        start = content.find('>', start) + 1
+        end = content.find('</pre>', start)
+        end = len(content) if end == -1 else end
+        escaped = True
+    pending = ''
+    for offset in range(start, end, size):
+        chunk = pending + content[offset:min(offset + size, end)]
+        pending = ''
+        if escaped:
+            # entity שנחתך בין שני מקטעים נדחה למקטע הבא
+            amp = chunk.rfind('&')
+            if amp != -1 and ';' not in chunk[amp:] and len(chunk) - amp < 12:
+                chunk, pending = chunk[:amp], chunk[amp:]
+            chunk = html.unescape(chunk)
+        if offset == start:
+            chunk = chunk.lstrip()
+        yield chunk
+    if pending:
+        yield html.unescape(pending)
+
+def iter_rss_items(content, limit=3):
+    """חילוץ זרימתי של פריטי RSS: עוצר אחרי limit פריטים ומשחרר כל פריט אחרי שנקרא"""
+    parser = etree.XMLPullParser(events=('end',), recover=True, encoding='utf-8')
+    found = 0
+    for chunk in _rss_chunks(content):
+        parser.feed(chunk.encode('utf-8'))
+        for _, element in parser.read_events():
+            if element.tag != 'item':
+                continue
+            fields = {}
+            for child in element:
+                if child.tag in ('title', 'link', 'guid', 'pubDate', DC_DATE_TAG) and child.tag not in fields:
+                    fields[child.tag] = (child.text or '').strip()
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+            yield fields
+            found += 1
+            if found >= limit:
+                return
+
+def _format_rss_date(fields, title):
+    pub_date = fields.get('pubDate')
+    if pub_date:
+        try:
+            parts = pub_date.split()
+            return f"{parts[1]} {MONTHS_HEBREW.get(parts[2], parts[2])} {parts[3]}"
+        except Exception as e:
+            logger.debug(f"Error formatting pubDate for item '{title}': {e}")
+    dc_date = fields.get(DC_DATE_TAG)
+    if dc_date:
+        try:
+            year, month, day = dc_date.split('T')[0].split('-')
+            return f"{day} {MONTHS_HEBREW.get(month, month)} {year}"
+        except Exception as e:
+            logger.debug(f"Error formatting dc:date for item '{title}': {e}")
+    return 'ללא שעה'
 
-def scrape_reshet13():
-    try:
-        url = TV_SITES['reshet13']
-        response = requests.get(url, headers=BASE_HEADERS, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        
-        logger.info(f"תגובה מלאה מרשת 13:\n{json.dumps(data, ensure_ascii=False, indent=2)}")
-        
-        page_props = data.get('pageProps', {})
-        if not page_props:
-            logger.error(f"לא נמצא 'pageProps' ב-JSON של רשת 13:\n{json.dumps(data, ensure_ascii=False, indent=2)}")
-            return [], "לא נמצא 'pageProps' בנתונים"
-        
-        page = page_props.get('page', {})
-        if not page:
-            logger.error(f"לא נמצא 'page' ב-pageProps של רשת 13:\n{json.dumps(page_props, ensure_ascii=False, indent=2)}")
-            return [], "לא נמצא 'page' בנתונים"
-        
-        content = page.get('Content', {})
+def parse_channel14_dataset(dataset_items):
+    results = []
+    for item in dataset_items[:3]:
+        content = item.get('content', '')
         if not content:
-            logger.error(f"לא נמצא 'Content' ב-page של רשת 13:\n{json.dumps(page, ensure_ascii=False, indent=2)}")
-            return [], "לא נמצא 'Content' בנתונים"
-        
-        page_grid = content.get('PageGrid', [])
-        if not page_grid or not isinstance(page_grid, list) or len(page_grid) == 0:
-            logger.error(f"לא נמצא 'PageGrid' תקף ב-Content של רשת 13:\n{json.dumps(content, ensure_ascii=False, indent=2)}")
-            return [], "לא נמצא 'PageGrid' תקף בנתונים"
-        
-        news_flash_arr = page_grid[0].get('newsFlashArr', [])
-        if not news_flash_arr:
-            news_flash_arr = page_props.get('newsFlashArr', [])
-            if not news_flash_arr:
-                logger.error(f"לא נמצא 'newsFlashArr' ב-PageGrid[0] או ב-pageProps:\n{json.dumps(page_grid[0], ensure_ascii=False, indent=2)}")
-                return [], "לא נמצא 'newsFlashArr' בנתונים"
-        
-        results = []
-        for item in news_flash_arr[:3]:
-            title = item.get('text', 'ללא כותרת')
-            link = item.get('link', '')
-            if link and not link.startswith('http'):
-                link = f"https://13tv.co.il{link}"
-            time_str = item.get('time', 'ללא שעה')
-            try:
-                time_formatted = time_str.replace('-', '/')[2:10] + ' ' + time_str[11:16]
-            except:
-                time_formatted = 'ללא שעה'
-            results.append({'time': time_formatted, 'title': title, 'link': link})
-        
-        logger.info(f"סקריפינג רשת 13 הצליח: {len(results)} מבזקים")
-        return results, None
-    except requests.exceptions.RequestException as e:
-        logger.error(f"שגיאה בבקשה לרשת 13: {str(e)}")
-        return [], f"שגיאה בבקשה: {str(e)}"
-    except ValueError as e:
-        logger.error(f"שגיאה בפענוח JSON מרשת 13: {str(e)}")
-        return [], f"שגיאה בפענוח JSON: {str(e)}"
-    except Exception as e:
-        logger.error(f"שגיאה לא צפויה בסקריפינג רשת 13: {str(e)}")
-        return [], f"שגיאה לא צפויה: {str(e)}"
+            logger.warning("Content is empty for this item")
+            continue
+
+        count = 0
+        for fields in iter_rss_items(content, limit=3):
+            title = fields.get('title') or 'ללא כותרת'
+            link = fields.get('link') or fields.get('guid') or None
+            logger.debug(f"Extracted link for item '{title}': {link}")
+            results.append({'time': _format_rss_date(fields, title), 'title': title, 'link': link})
+            count += 1
+        if not count:
+            logger.warning(f"לא נמצאו תגיות <item> ב-RSS (אורך התוכן: {len(content)} תווים)")
+    return results
+
+async def _apify_get(path):
+    headers = {
+        "Authorization": f"Bearer {APIFY_API_TOKEN}",
+        "Content-Type": "application/json"
+    }
+    return await http_client.fetch_json(f"{APIFY_API_URL}{path}", headers=headers, timeout=30)
 
-def scrape_keshet12():
-    try:
-        response = requests.get(TV_SITES['keshet12'], headers=BASE_HEADERS, timeout=15)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        items = soup.select('ul.grid-ordering.mainItem6 > li')[:3]
-        results = []
-        for item in items:
-            title_tag = item.select_one('p strong a')
-            link_tag = title_tag
-            time_tag = item.select('small span')[1] if len(item.select('small span')) > 1 else None
-            title = title_tag.get_text(strip=True) if title_tag else 'ללא כותרת'
-            link = link_tag['href'] if link_tag else '#'
-            if not link.startswith('http'):
-                link = f"https://www.mako.co.il{link}"
-            article_time = time_tag.get_text(strip=True) if time_tag else 'ללא שעה'
-            results.append({'time': article_time, 'title': title, 'link': link})
-        logger.info(f"סקריפינג קשת 12 הצליח: {len(results)} כתבות")
-        return results, None
-    except Exception as e:
-        logger.error(f"שגיאה בסקריפינג קשת 12: {str(e)}")
-        return [], f"שגיאה בסקריפינג: {str(e)}"
+async def _backoff(attempt, retry_delay):
+    # המתנה אסינכרונית: שאר המשתמשים ממשיכים לקבל מענה בזמן שערוץ 14 ממתין
+    delay = retry_delay * (2 ** attempt) * random.uniform(0.8, 1.2)
+    logger.info(f"Retrying Apify in {delay:.1f} seconds...")
+    await asyncio.sleep(delay)
 
 async def run_apify_actor():
     logger.debug("Running Apify Actor...")
     max_retries = 3
-    retry_delay = 5
-    months_hebrew = {
-        'Jan': 'ינואר', 'Feb': 'פברואר', 'Mar': 'מרץ', 'Apr': 'אפריל',
-        'May': 'מאי', 'Jun': 'יוני', 'Jul': 'יולי', 'Aug': 'אוגוסט',
-        'Sep': 'ספטמבר', 'Oct': 'אוקטובר', 'Nov': 'נובמבר', 'Dec': 'דצמבר'
-    }
+    retry_delay = 2
 
     for attempt in range(max_retries):
         try:
-            url = f"{APIFY_API_URL}/acts/{APIFY_ACTOR_ID}/runs?limit=2&desc=1"
-            headers = {
-                "Authorization": f"Bearer {APIFY_API_TOKEN}",
-                "Content-Type": "application/json"
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-            if response.status_code != 200:
-                logger.error(f"Failed to fetch latest Apify Actor run: {response.status_code} - {response.text}")
-                response.raise_for_status()
-            run_data = response.json()
+            run_data = await _apify_get(f"/acts/{APIFY_ACTOR_ID}/runs?limit=2&desc=1")
             
             if not run_data.get('data', {}).get('items'):
                 logger.error("No runs found for this Actor.")
@@ -157,8 +155,7 @@ async def run_apify_actor():
                     logger.info("Using previous successful run.")
                 else:
                     if attempt < max_retries - 1:
-                        logger.info(f"Waiting {retry_delay} seconds before retrying...")
-                        time.sleep(retry_delay)
+                        await _backoff(attempt, retry_delay)
                         continue
                     else:
                         logger.error("All runs failed or still running after retries.")
@@ -173,96 +170,32 @@ async def run_apify_actor():
                 logger.error("No dataset ID found in the latest run.")
                 return [], "לא נמצא Dataset ID עבור הריצה האחרונה."
 
-            dataset_url = f"{APIFY_API_URL}/datasets/{dataset_id}/items"
-            dataset_response = requests.get(dataset_url, headers=headers, timeout=30)
-            if dataset_response.status_code != 200:
-                logger.error(f"Failed to fetch dataset items: {dataset_response.status_code} - {dataset_response.text}")
-                dataset_response.raise_for_status()
-            
-            dataset_items = dataset_response.json()
-            logger.debug(f"Dataset items: {json.dumps(dataset_items, ensure_ascii=False)[:2000]}... (truncated)")
+            cached = _channel14_by_dataset.get(dataset_id)
+            if cached is not None:
+                logger.debug(f"Dataset {dataset_id} of run {latest_run['id']} already parsed, using cached items")
+                return cached, None
+
+            dataset_items = await _apify_get(f"/datasets/{dataset_id}/items")
             if not dataset_items:
                 logger.warning("לא נמצאו פריטים ב-Dataset")
                 return [], "לא נמצאו מבזקים ב-Dataset של הריצה האחרונה"
+            # בלי סריאליזציה של כל ה-Dataset: רק מספר הפריטים ותחילת התוכן של הראשון
+            logger.debug(f"Dataset {dataset_id}: {len(dataset_items)} items, first content: {dataset_items[0].get('content', '')[:DEBUG_CONTENT_CHARS]!r}")
 
-            results = []
-            for item in dataset_items[:3]:
-                content = item.get('content', '')
-                logger.debug(f"Processing dataset item content (raw): {content[:2000]}... (truncated)")
-                if not content:
-                    logger.warning("Content is empty for this item")
-                    continue
-                
-                soup = BeautifulSoup(content, 'html.parser')
-                pre_content = soup.find('pre').text if soup.find('pre') else content
-                logger.debug(f"Cleaned pre content: {pre_content[:2000]}... (truncated)")
-                
-                rss_soup = BeautifulSoup(pre_content, 'lxml')
-                items = rss_soup.select('item')[:3]
-                if not items:
-                    logger.warning("לא נמצאו תגיות <item> ב-RSS")
-                    all_tags = [tag.name for tag in rss_soup.find_all()]
-                    logger.debug(f"כל התגיות שנמצאו ב-RSS: {all_tags}")
-                    logger.debug(f"Full RSS structure: {rss_soup.prettify()[:2000]}... (truncated)")
-                    continue
-
-                for rss_item in items:
-                    title = rss_item.find('title')
-                    title = title.get_text(strip=True) if title else 'ללא כותרת'
-                    
-                    link = None
-                    link_tag = rss_item.find('link')
-                    if link_tag and link_tag.string:
-                        link = link_tag.string.strip()
-                    logger.debug(f"Extracted link for item '{title}': {link}")
-                    
-                    if not link:
-                        guid_tag = rss_item.find('guid')
-                        if guid_tag and guid_tag.string:
-                            link = guid_tag.string.strip()
-                        logger.debug(f"Extracted link from guid for item '{title}': {link}")
-                    
-                    pub_date = rss_item.find('pubdate')
-                    if pub_date and pub_date.string:
-                        pub_date = pub_date.string.strip()
-                        try:
-                            parts = pub_date.split()
-                            day = parts[1]
-                            month = months_hebrew.get(parts[2], parts[2])
-                            year = parts[3]
-                            pub_date = f"{day} {month} {year}"
-                        except Exception as e:
-                            logger.debug(f"Error formatting pubDate for item '{title}': {e}")
-                            pub_date = 'ללא שעה'
-                    else:
-                        pub_date = 'ללא שעה'
-                    
-                    if pub_date == 'ללא שעה':
-                        date_tag = rss_item.find('dc:date')
-                        pub_date = date_tag.string.strip() if date_tag and date_tag.string else 'ללא שעה'
-                        if pub_date != 'ללא שעה':
-                            try:
-                                date_parts = pub_date.split('T')[0].split('-')
-                                year, month, day = date_parts
-                                month = months_hebrew.get(month, month)
-                                pub_date = f"{day} {month} {year}"
-                            except Exception as e:
-                                logger.debug(f"Error formatting dc:date for item '{title}': {e}")
-                                pub_date = 'ללא שעה'
-                    
-                    results.append({'time': pub_date, 'title': title, 'link': link})
-
+            results = parse_channel14_dataset(dataset_items)
             if not results:
                 logger.warning("לא נמצאו מבזקים תקינים לאחר עיבוד")
                 return [], "לא נמצאו מבזקים תקינים לאחר עיבוד"
 
+            # שומרים רק את ה-Dataset האחרון; ריצה חדשה מחליפה אותו
+            _channel14_by_dataset.clear()
+            _channel14_by_dataset[dataset_id] = results
             logger.info(f"שאיבה מערוץ 14 דרך Apify הצליחה: {len(results)} מבזקים")
             return results, None
 
         except Exception as e:
             logger.error(f"שגיאה בשאיבת תוצאות ה-Actor מ-Apify: {str(e)}")
             if attempt < max_retries - 1:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+                await _backoff(attempt, retry_delay)
                 continue
             return [], f"שגיאה בשאיבה דרך Apify לאחר {max_retries} ניסיונות: {str(e)}"
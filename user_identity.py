@@ -0,0 +1,60 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+IDENTITY_TTL = int(os.getenv("IDENTITY_TTL", "3600"))
+
+class IdentityCache:
+    """מטמון LRU+TTL של user_id (או chat_id של עדכון בלי משתמש) -> username"""
+
+    def __init__(self, size=IDENTITY_CACHE_SIZE, ttl=IDENTITY_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        """מחזיר (username, עדיין בתוקף) או (None, False) אם המשתמש לא מוכר"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None, False
+        self._entries.move_to_end(user_id)
+        username, expires_at = entry
+        return username, time.monotonic() < expires_at
+
+    def put(self, user_id, username):
+        self._entries[user_id] = (username, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+identity_cache = IdentityCache()
+_refreshing = set()
+
+async def _refresh(bot, chat_id):
+    try:
+        chat = await bot.get_chat(chat_id)
+        identity_cache.put(chat_id, chat.username)
+    except Exception as e:
+        logger.debug(f"Could not refresh username of {chat_id}: {e}")
+    finally:
+        _refreshing.discard(chat_id)
+
+def resolve_username(update, context):
+    """שם המשתמש מתוך העדכון עצמו: כשיש בו משתמש זו התשובה הסופית, גם אם אין לו שם משתמש.
+    עדכון בלי משתמש (למשל פוסט בערוץ) - מהמטמון לפי הצ'אט, עם רענון ברקע שלא מעכב את התשובה"""
+    user = update.effective_user
+    if user is not None:
+        identity_cache.put(user.id, user.username)
+        return user.username
+    chat = update.effective_chat
+    if chat is None:
+        return None
+    username, fresh = identity_cache.get(chat.id)
+    if not fresh and chat.id not in _refreshing:
+        _refreshing.add(chat.id)
+        context.application.create_task(_refresh(context.bot, chat.id))
+    return username
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import secrets
+import signal
+
+from aiohttp import web
+from telegram import Update
+
+import metrics
+import startup
+
+logger = logging.getLogger(__name__)
+
+# polling (ברירת המחדל) או webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+PORT = int(os.getenv("PORT", "10000"))
+# הכתובת הציבורית שטלגרם שולח אליה עדכונים; בלי כתובת השרת רק מקבל עדכונים, וכך אפשר לבדוק מקומית:
+# BOT_MODE=webhook python newsflashil.py ואז curl -d @update.json -H 'Content-Type: application/json' localhost:10000/telegram
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+async def health(request):
+    logger.debug("Health route accessed")
+    return web.Response(text="Bot is alive!")
+
+async def metrics_route(request):
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8", headers={"X-Content-Type-Options": "nosniff"})
+
+def _webhook_handler(application, secret):
+    async def handle(request):
+        if secret and not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            logger.warning(f"Rejected webhook call from {request.remote}: bad secret token")
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            if not isinstance(data, dict):
+                raise TypeError(f"expected a JSON object, got {type(data).__name__}")
+            update = Update.de_json(data, application.bot)
+        # AttributeError: שדה מקונן שאינו אובייקט, למשל "message": [1]
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            return web.Response(status=400)
+        # טלגרם מקבל תשובה מיד; העדכון מטופל בלולאה של הבוט
+        await application.update_queue.put(update)
+        return web.Response()
+    return handle
+
+def create_web_app(application, webhook=True, secret=WEBHOOK_SECRET, path=WEBHOOK_PATH):
+    """שרת aiohttp אחד לנתיב הבריאות ולקבלת עדכונים מטלגרם, על אותה לולאה של הבוט"""
+    web_app = web.Application()
+    web_app.router.add_get('/', health)
+    web_app.router.add_get('/metrics', metrics_route)
+    if webhook:
+        web_app.router.add_post(path, _webhook_handler(application, secret))
+    return web_app
+
+async def _serve(application, webhook):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    secret = WEBHOOK_SECRET
+    if webhook and WEBHOOK_URL and not secret:
+        # בלי סוד כל אחד יכול לשלוח לנתיב עדכונים מזויפים; טלגרם מקבל את הסוד ב-set_webhook ומצרף אותו לכל עדכון
+        secret = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET לא מוגדר - נוצר סוד אקראי להרצה הזו")
+
+    runner = web.AppRunner(create_web_app(application, webhook=webhook, secret=secret))
+    await runner.setup()
+    try:
+        async with application:
+            # run_polling מפעיל את post_init ו-post_shutdown בעצמו; כאן מפעילים אותם ידנית
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            startup.mark("bot_init")
+            if webhook:
+                if WEBHOOK_URL:
+                    await application.bot.set_webhook(
+                        url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                        secret_token=secret,
+                        allowed_updates=Update.ALL_TYPES
+                    )
+                    logger.info(f"Webhook set to {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+                else:
+                    logger.warning("WEBHOOK_URL לא מוגדר - העדכונים יתקבלו רק מבקשות POST ישירות לשרת")
+            else:
+                await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            site = web.TCPSite(runner, host="0.0.0.0", port=PORT)
+            await site.start()
+            logger.info(f"Web server listening on port {PORT} ({'webhook' if webhook else 'polling'} mode)")
+            startup.report()
+            try:
+                await stop_event.wait()
+            finally:
+                logger.info("Shutting down...")
+                await runner.cleanup()
+                if application.updater.running:
+                    await application.updater.stop()
+                await application.stop()
+    finally:
+        # כמו ב-run_polling: post_shutdown רץ אחרי application.shutdown(), שנקרא ביציאה מ-async with
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def run(application, mode=BOT_MODE):
+    """מריץ את הבוט ואת שרת ה-HTTP באותה לולאת asyncio, במצב webhook או polling"""
+    asyncio.run(_serve(application, webhook=mode == "webhook"))